@@ -10,6 +10,10 @@ import os
 import ui
 import data_manager
 import common
+import bulk
+import column_store
+import parallel
+import partitions
 
 ID = 0
 MONTH = 1
@@ -18,6 +22,13 @@ YEAR = 3
 TYPE = 4
 AMOUNT = 5
 
+DATE_COLUMNS = (YEAR, MONTH, DAY)
+
+DATA_FILE = "accounting/items.csv"
+
+Transaction = common.record_type("Transaction", ("id", "month", "day", "year", "type", "amount"),
+                                 int_columns=(MONTH, DAY, YEAR, AMOUNT), file_name=DATA_FILE)
+
 INPUT_DESCRIPTIONS = [("Please enter the month: ", common.validate_month),
                       ("Please enter the day: ", common.validate_day),
                       ("Please enter the year: ", common.validate_byear),
@@ -50,6 +61,7 @@ def menuaction_remove(table):
 
 
 def menuaction_highest_profit(table):
+    ui.clear_scr()
     ui.print_result("The year with the highest profit is {0}".format(which_year_max(table)))
 
 
@@ -64,12 +76,13 @@ def menuaction_profit_per_year(table):
         if common.index_of_value(table, YEAR, input_year) == -1:
             continue
         break
+    ui.clear_scr()
     ui.print_result(avg_amount(table, input_year),
                     "The average amount of USD profit per game in {0} is".format(input_year))
 
 
 def menuaction_exit(accounting_file, table):
-    data_manager.write_table_to_file(accounting_file, table)
+    data_manager.save_table(accounting_file, table)
     ui.clear_scr()
 
 
@@ -83,8 +96,8 @@ def start_module(table_cont=None):
         table_cont: use the previously opened table,
             in case of keyboard interrupt
     """
-    accounting_file = "accounting/items.csv"
-    table = data_manager.get_table_from_file(accounting_file)
+    accounting_file = DATA_FILE
+    table = data_manager.open_journaled_table(accounting_file)
 
     options = ["Show table",
                "Add entry",
@@ -139,39 +152,120 @@ def remove(table, id_):
     return common.remove_line(table, id_)
 
 
+def import_file(batch_file):
+    """Adds the rows of a csv or JSONL batch file to the data file without prompting. Returns the new IDs."""
+    return bulk.import_batch(DATA_FILE, batch_file, INPUT_DESCRIPTIONS)
+
+
+def export_file(out_file):
+    """Writes the table into a csv or JSONL file. Returns the number of exported rows."""
+    return bulk.export_table(DATA_FILE, out_file)
+
+
 def update(table, id_):
     """Updates specified record in the table. Asks users for new data. Returns table with the updated record."""
     return common.update_line(table, id_, INPUT_DESCRIPTIONS)
 
 
+def signed_amount(row):
+    """Returns the amount of the transaction as profit: positive for 'in', negative for 'out'."""
+    if row[TYPE] == 'in':
+        return int(row[AMOUNT])
+    if row[TYPE] == 'out':
+        return -int(row[AMOUNT])
+    return 0
+
+
+def income(row):
+    """Returns the amount of an 'in' transaction, 0 for the others."""
+    return int(row[AMOUNT]) if row[TYPE] == 'in' else 0
+
+
+def expense(row):
+    """Returns the amount of an 'out' transaction, 0 for the others."""
+    return int(row[AMOUNT]) if row[TYPE] == 'out' else 0
+
+
+# Totals kept per year when the table is partitioned, see data_manager.use_partitions.
+PARTITION_TOTALS = {"in": income, "out": expense}
+
+
+def get_profit_per_year(table):
+    '''
+    Goes through the rows once, adding up the 'in' and subtracting the 'out' values per year.
+    Returns a dictionary with the years (as in the year column, strings) as keys and the profits as values.
+    The table can be any iterable of rows, like data_manager.iter_table_from_file,
+    or a column_store.ColumnStore for vectorized evaluation.
+    A PartitionedTable with the totals of PARTITION_TOTALS is answered from its partition metadata without reading rows.
+    '''
+    if isinstance(table, column_store.ColumnStore):
+        profits = table.group_total(YEAR, AMOUNT, weights=table.sign(TYPE, 'in', 'out'))
+        return {str(year): profit for year, profit in profits.items()}
+    if isinstance(table, partitions.PartitionedTable) and table.has_totals(*PARTITION_TOTALS):
+        return {year: table.summary(year)["totals"]["in"] - table.summary(year)["totals"]["out"]
+                for year in table.years()}
+    aggregates = common.group_aggregate(table, YEAR, {"profit": (signed_amount, "sum")})
+    return {year: aggregate["profit"] for year, aggregate in aggregates.items()}
+
+
 def which_year_max(table):
     '''
-    Goes through each unique year, counting the sum of the profits.
-    Then subtracts the 'out' values.
-    Compares and returns the year with the highest profit.
+    Compares the profits of the years (see get_profit_per_year) and returns the year with the highest profit.
     '''
-    ui.clear_scr()
+    return year_of_max_profit(get_profit_per_year(table))
+
+
+def year_of_max_profit(profits):
+    """Returns the year with the highest profit of a year -> profit dictionary, as an integer."""
     max_profit, current_year = 0, 0
-    for year in {row[YEAR] for row in table}:
-        temp_sum = common.szum_list(
-            [int(row[AMOUNT]) for row in table if row[YEAR] == year and row[TYPE] == 'in'])
-        temp_sum -= common.szum_list(
-            [int(row[AMOUNT]) for row in table if row[YEAR] == year and row[TYPE] == 'out'])
-        if temp_sum > max_profit:
-            max_profit, current_year = temp_sum, year
+    for year, profit in profits.items():
+        if profit > max_profit:
+            max_profit, current_year = profit, year
 
     current_year = int(current_year)
     return current_year
 
 
+def which_year_max_from_file(file_name):
+    """Streaming variant of which_year_max, reads the file row by row."""
+    return which_year_max(data_manager.iter_table_from_file(file_name))
+
+
+def which_year_max_parallel(table, workers=None):
+    """
+    Variant of which_year_max adding up the profits of chunks of the table on all cores, see parallel.map_reduce.
+    A PartitionedTable with the totals of PARTITION_TOTALS is answered from its metadata instead,
+    like by which_year_max.
+    """
+    if isinstance(table, partitions.PartitionedTable) and table.has_totals(*PARTITION_TOTALS):
+        return which_year_max(table)
+    return year_of_max_profit(parallel.map_reduce(get_profit_per_year, table, parallel.merge_totals, workers))
+
+
 def avg_amount(table, input_year):
     '''
     Goes through each unique year, counting the sum of the profits.
     Then subtracts the 'out' values.
     Divides that by the number of lines
     and returns the year with the average profit. (float)
+    The table can also be a column_store.ColumnStore for vectorized evaluation,
+    or a PartitionedTable, answered from the metadata of the year's partition if it has the totals of PARTITION_TOTALS.
     '''
-    ui.clear_scr()
+    if isinstance(table, partitions.PartitionedTable) and table.has_totals(*PARTITION_TOTALS):
+        summary = table.summary(input_year)
+        if summary is None:
+            ui.print_error_message("Not a valid year.")
+            return
+        return (summary["totals"]["in"] - summary["totals"]["out"]) / summary["rows"]
+
+    if isinstance(table, column_store.ColumnStore):
+        in_year = table.equals(YEAR, int(input_year) if table.is_int_column(YEAR) else str(input_year))
+        temp_count = table.size(in_year)
+        if temp_count == 0:
+            ui.print_error_message("Not a valid year.")
+            return
+        return table.total(AMOUNT, in_year, table.sign(TYPE, 'in', 'out')) / temp_count
+
     input_year = str(input_year)
     years = {line[YEAR] for line in table}
     if input_year not in years:
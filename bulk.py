@@ -0,0 +1,126 @@
+"""
+Non-interactive bulk import and export of module tables.
+
+A batch is either a csv file (one row per line, cells separated by ";" like the data files, without the ID
+column) or a JSONL file (one JSON array of cells, or one JSON object keyed by the field names of the
+module's record type, per line). Every module exposes import_file and export_file built on this module.
+"""
+
+import csv
+import json
+import os
+
+import common
+import data_manager
+from tables import RECORD_TYPES
+from validation import RowValidator
+
+# Number of invalid cells listed in the error of a rejected batch.
+MAX_REPORTED_ERRORS = 10
+
+
+def __is_jsonl(file_name):
+    return os.path.splitext(file_name)[1].lower() in (".jsonl", ".ndjson")
+
+
+def __json_row(line, fields):
+    """Converts a parsed JSONL line to a row of strings."""
+    if isinstance(line, dict):
+        return [str(line.get(field, "")) for field in fields]
+    return [str(cell) for cell in line]
+
+
+def read_batch(batch_file, fields=(), delimiter=";"):
+    """
+    Reads a batch file (see the module docstring).
+
+    Args:
+        batch_file (str): name of the csv or JSONL (.jsonl) file
+        fields (tuple): names of the columns, used to read JSON objects
+        delimiter (str): cell separator of csv files
+
+    Returns:
+        List of rows of strings.
+    """
+    with open(batch_file, "r", newline="") as file:
+        if __is_jsonl(batch_file):
+            return [__json_row(json.loads(line), fields) for line in file if line.strip()]
+        return [row for row in csv.reader(file, delimiter=delimiter) if row]
+
+
+def validate_batch(rows, input_specifiers):
+    """
+    Checks a batch with the validators the module uses for interactive input, compiled into a
+    validation.RowValidator.
+
+    Args:
+        rows: list of rows of strings, without the ID column
+        input_specifiers (list of tuples): request message-validator function pairs, as passed to common.add_line
+
+    Returns:
+        A list of (row number, message) pairs, empty if the whole batch is valid.
+    """
+    return RowValidator(input_specifiers).validate(rows)
+
+
+def import_batch(file_name, batch_file, input_specifiers, delimiter=";"):
+    """
+    Validates a batch, gives its rows fresh IDs and appends them to the journal of the data file in a
+    single write (see data_manager.append_rows). The table is only streamed once to collect its IDs.
+    Nothing is written if any cell of the batch is invalid.
+
+    Args:
+        file_name (str): the data file of the module
+        batch_file (str): the csv or JSONL file to import
+        input_specifiers (list of tuples): the module's request message-validator function pairs
+        delimiter (str): cell separator of csv batches
+
+    Returns:
+        The list of IDs given to the imported rows, in batch order.
+
+    Raises:
+        ValueError: if the batch has invalid cells.
+    """
+    record_class = RECORD_TYPES.get(file_name)
+    fields = record_class.fields[1:] if record_class is not None else ()
+    rows = read_batch(batch_file, fields, delimiter)
+
+    errors = validate_batch(rows, input_specifiers)
+    if errors:
+        raise ValueError("{} invalid cells in {}: {}".format(
+            len(errors), batch_file,
+            "; ".join(["row {}: {}".format(row_number + 1, message)
+                       for row_number, message in errors[:MAX_REPORTED_ERRORS]])))
+
+    new_ids = common.IdAllocator(data_manager.iter_table_from_file(file_name)).batch(len(rows))
+    data_manager.append_rows(file_name, [[id_] + row for id_, row in zip(new_ids, rows)])
+    return new_ids
+
+
+def export_table(file_name, out_file, delimiter=";"):
+    """
+    Writes the table of a data file (with its journal applied) into a csv or JSONL file.
+    JSONL lines are objects keyed by the field names of the module's record type, if it has one.
+
+    Args:
+        file_name (str): the data file of the module
+        out_file (str): the csv or JSONL file to write
+        delimiter (str): cell separator of csv files
+
+    Returns:
+        The number of exported rows.
+    """
+    record_class = RECORD_TYPES.get(file_name)
+    rows = 0
+    with open(out_file, "w", newline="") as file:
+        if __is_jsonl(out_file):
+            for row in data_manager.iter_table_from_file(file_name):
+                line = dict(zip(record_class.fields, row)) if record_class is not None else row
+                file.write(json.dumps(line) + "\n")
+                rows += 1
+        else:
+            writer = csv.writer(file, delimiter=delimiter, lineterminator="\n")
+            for row in data_manager.iter_table_from_file(file_name):
+                writer.writerow(row)
+                rows += 1
+    return rows
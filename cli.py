@@ -0,0 +1,232 @@
+"""
+Headless command line interface for the module queries and data analyser reports, e.g.
+
+    python main.py report sales.sum-per-customer --format csv
+    python main.py report data-analyser.most-frequent-buyer-names 3 --format json
+    python main.py list
+
+Results are written to stdout in a machine-readable format; nothing is cleared or asked interactively,
+so reports can run from cron and be timed (--time writes the run time of the query to stderr).
+Invalid arguments end the command with a message on stderr and exit status 2.
+"""
+
+import argparse
+import contextlib
+import csv
+import importlib
+import json
+import sys
+import time
+
+import common
+import data_manager
+
+OUTPUT_FORMATS = ("csv", "json")
+
+# Report name -> (module, function, parameters, whether the function takes the module's table first).
+# Parameters are (name, type) pairs; a name ending in "..." takes any number of values.
+REPORTS = {
+    "store.counts-by-manufacturer": ("store.store", "get_counts_by_manufacturers", (), True),
+    "store.average-by-manufacturer": ("store.store", "get_average_by_manufacturer", (("manufacturer", str),), True),
+    "hr.oldest-persons": ("hr.hr", "get_oldest_person", (), True),
+    "hr.closest-to-average": ("hr.hr", "get_persons_closest_to_average", (), True),
+    "inventory.available-items": ("inventory.inventory", "get_available_items", (), True),
+    "inventory.average-durability": ("inventory.inventory", "get_average_durability_by_manufacturers", (), True),
+    "accounting.year-max": ("accounting.accounting", "which_year_max", (), True),
+    "accounting.average-amount": ("accounting.accounting", "avg_amount", (("year", int),), True),
+    "sales.lowest-price-item": ("sales.sales", "get_lowest_price_item_id", (), True),
+    "sales.sold-between": ("sales.sales", "get_items_sold_between",
+                           (("month_from", int), ("day_from", int), ("year_from", int),
+                            ("month_to", int), ("day_to", int), ("year_to", int)), True),
+    "sales.title": ("sales.sales", "get_title_by_id", (("sale_id", str),), False),
+    "sales.last-sold-id": ("sales.sales", "get_item_id_sold_last", (), False),
+    "sales.last-sold-title": ("sales.sales", "get_item_title_sold_last_from_table", (), True),
+    "sales.last-sold-ids": ("sales.sales", "get_item_ids_sold_last_from_table", (("n", int),), True),
+    "sales.sum-of-prices": ("sales.sales", "get_the_sum_of_prices", (("sale_id...", str),), False),
+    "sales.customer-of-sale": ("sales.sales", "get_customer_id_by_sale_id", (("sale_id", str),), False),
+    "sales.customer-ids": ("sales.sales", "get_all_customer_ids", (), False),
+    "sales.sales-per-customer": ("sales.sales", "get_all_sales_ids_for_customer_ids", (), False),
+    "sales.num-per-customer": ("sales.sales", "get_num_of_sales_per_customer_ids", (), False),
+    "sales.num-per-customer-name": ("sales.sales", "get_num_of_sales_per_customer_names", (), False),
+    "sales.sum-per-customer": ("sales.sales", "get_sum_of_sales_per_customer", (), False),
+    "sales.buyer-emails": ("sales.sales", "get_buyer_emails", (), False),
+    "crm.longest-name-id": ("crm.crm", "get_longest_name_id", (), True),
+    "crm.subscribed-emails": ("crm.crm", "get_subscribed_emails", (), True),
+    "crm.name": ("crm.crm", "get_name_by_id", (("customer_id", str),), False),
+    "crm.email": ("crm.crm", "get_email_by_id", (("customer_id", str),), False),
+    "crm.customer-ids": ("crm.crm", "get_all_customer_ids", (), False),
+    "logistics.total-per-retailer": ("logistics.logistics", "get_price_total_per_retailer", (), True),
+    "logistics.date-ordered-payments": ("logistics.logistics", "date_ordered_payments", (), True),
+    "logistics.arrival-contacts": ("logistics.logistics", "get__arrivals_contact_info", (), False),
+    "logistics.payment-totals": ("logistics.logistics", "get__payment_total_contacts", (), False),
+    "partners.info": ("partners.partners", "get_info_by_id", (("partner_id", str), ("column", int)), False),
+    "data-analyser.last-buyer-name": ("data_analyser.data_analyser", "get_the_last_buyer_name", (), False),
+    "data-analyser.last-buyer-id": ("data_analyser.data_analyser", "get_the_last_buyer_id", (), False),
+    "data-analyser.top-spender-name": ("data_analyser.data_analyser",
+                                       "get_the_buyer_name_spent_most_and_the_money_spent", (), False),
+    "data-analyser.top-spender-id": ("data_analyser.data_analyser",
+                                     "get_the_buyer_id_spent_most_and_the_money_spent", (), False),
+    "data-analyser.most-frequent-buyer-names": ("data_analyser.data_analyser", "get_the_most_frequent_buyers_names",
+                                                (("num", int),), False),
+    "data-analyser.most-frequent-buyer-ids": ("data_analyser.data_analyser", "get_the_most_frequent_buyers_ids",
+                                              (("num", int),), False),
+    "data-analyser.idle-customers": ("data_analyser.data_analyser", "get_idle_customers", (), False),
+    "data-analyser.buyer-emails": ("data_analyser.data_analyser", "get_buyer_emails", (), False),
+    "data-analyser.earliest-arrivals": ("data_analyser.data_analyser", "get_earliers_arrivals_contact_info",
+                                        (("num", int),), False),
+    "data-analyser.most-expensive-orders": ("data_analyser.data_analyser", "get_most_expensive_orders_info",
+                                            (("num", int),), False),
+}
+
+
+def __known_year(module, table, year):
+    if str(year) not in {row[module.YEAR] for row in table}:
+        return "no data of the year {}".format(year)
+
+
+def __valid_dates(module, table, month_from, day_from, year_from, month_to, day_to, year_to):
+    try:
+        common.dtime(year_from, month_from, day_from)
+        common.dtime(year_to, month_to, day_to)
+    except ValueError as err:
+        return str(err)
+
+
+# Report name -> function(module, table, *arguments) returning an error message if the report cannot answer
+# the arguments, None otherwise. Checked before the report runs, so the error ends the command instead of
+# being printed as the report's result.
+ARGUMENT_CHECKS = {
+    "accounting.average-amount": __known_year,
+    "sales.sold-between": __valid_dates,
+}
+
+
+def __convert_arguments(name, values):
+    """Converts the command line values to the parameter types of a report. Raises ValueError if they do not fit."""
+    parameters = REPORTS[name][2]
+    arguments = []
+    for position, (parameter, parameter_type) in enumerate(parameters):
+        if parameter.endswith("..."):
+            arguments.append([parameter_type(value) for value in values[position:]])
+            return arguments
+        if position >= len(values):
+            raise ValueError("missing argument: {}".format(parameter))
+        arguments.append(parameter_type(values[position]))
+    if len(values) > len(parameters):
+        raise ValueError("too many arguments")
+    return arguments
+
+
+def prepare_report(name, values=()):
+    """
+    Converts and checks the arguments of a report by name (see REPORTS), loading the module's table if the
+    query takes it.
+
+    Args:
+        name (str): name of the report, e.g. "sales.sum-per-customer"
+        values: the report's arguments as strings
+
+    Returns:
+        The query function and the list of arguments to call it with.
+
+    Raises:
+        ValueError: if the arguments do not fit the report (see ARGUMENT_CHECKS).
+    """
+    module_name, function_name, _, uses_table = REPORTS[name]
+    module = importlib.import_module(module_name)
+    arguments = __convert_arguments(name, list(values))
+    table = data_manager.get_table_from_file(module.DATA_FILE) if uses_table else None
+    if name in ARGUMENT_CHECKS:
+        error = ARGUMENT_CHECKS[name](module, table, *arguments)
+        if error is not None:
+            raise ValueError(error)
+    if uses_table:
+        arguments.insert(0, table)
+    return getattr(module, function_name), arguments
+
+
+def run_report(name, values=()):
+    """Runs a report by name (see prepare_report) and returns the result of the query function."""
+    function, arguments = prepare_report(name, values)
+    return function(*arguments)
+
+
+def __cells(value):
+    if isinstance(value, (list, tuple)):
+        return [str(cell) for cell in value]
+    if isinstance(value, set):
+        return common.srt([str(cell) for cell in value])
+    return [str(value)]
+
+
+def to_rows(result):
+    """Flattens a query result into rows of strings: one row per item, or a key followed by its value(s) for dicts."""
+    if result is None:
+        return []
+    if isinstance(result, dict):
+        return [[str(key)] + __cells(value) for key, value in result.items()]
+    if isinstance(result, tuple) and not [cell for cell in result if isinstance(cell, (list, tuple, set))]:
+        return [__cells(result)]
+    if isinstance(result, (list, tuple, set)):
+        return [__cells(item) for item in (common.srt(list(result)) if isinstance(result, set) else result)]
+    return [[str(result)]]
+
+
+def __json_default(value):
+    if isinstance(value, set):
+        return common.srt(list(value))
+    return str(value)
+
+
+def write_result(result, output_format, stream):
+    """Writes a query result to the stream as csv (see to_rows) or json."""
+    if output_format == "json":
+        json.dump(result, stream, default=__json_default)
+        stream.write("\n")
+    else:
+        csv.writer(stream, lineterminator="\n").writerows(to_rows(result))
+
+
+def __parser():
+    parser = argparse.ArgumentParser(prog="main.py", description="Runs reports without the interactive menu.")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    report = commands.add_parser("report", help="run a report and write its result to stdout")
+    report.add_argument("name", choices=common.srt(list(REPORTS)), metavar="name",
+                        help="name of the report, see the list command")
+    report.add_argument("arguments", nargs="*", help="arguments of the report")
+    report.add_argument("--format", choices=OUTPUT_FORMATS, default="csv", help="output format (default: csv)")
+    report.add_argument("--time", action="store_true", help="write the run time of the report to stderr")
+
+    commands.add_parser("list", help="list the reports and their arguments")
+    return parser
+
+
+def main(argv):
+    """
+    Runs the command line interface. The data files are looked up relative to the working directory, which
+    main.py sets to the directory of the program. Returns the exit status.
+    """
+    parser = __parser()
+    options = parser.parse_args(argv)
+
+    if options.command == "list":
+        for name in common.srt(list(REPORTS)):
+            sys.stdout.write(" ".join([name] + [parameter for parameter, _ in REPORTS[name][2]]) + "\n")
+        return 0
+
+    start = time.perf_counter()
+    try:
+        function, arguments = prepare_report(options.name, options.arguments)
+    except ValueError as err:
+        parser.error("{}: {}".format(options.name, err))
+    # Anything a query prints for the interactive menu goes to stderr, keeping stdout machine-readable.
+    with contextlib.redirect_stdout(sys.stderr):
+        result = function(*arguments)
+    elapsed = time.perf_counter() - start
+
+    write_result(result, options.format, sys.stdout)
+    if options.time:
+        sys.stderr.write("{}: {:.6f} s\n".format(options.name, elapsed))
+    return 0
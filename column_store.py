@@ -0,0 +1,164 @@
+"""
+Column-oriented, typed in-memory tables for the numeric reports.
+
+A ColumnStore keeps every column of a table as one array: with NumPy installed integer columns are int64
+arrays and the reports run as vectorized masks and grouped reductions; without NumPy the very same methods
+fall back to plain Python lists. Report functions (accounting.which_year_max, accounting.avg_amount,
+hr.get_persons_closest_to_average, inventory.get_available_items) accept a ColumnStore in place of a table.
+"""
+
+from array import array
+from importlib.util import find_spec
+
+import data_manager
+
+# NumPy is only imported once the first ColumnStore is built, as importing it takes longer than the modules
+# importing this one need to start.
+HAS_NUMPY = find_spec("numpy") is not None
+numpy = None
+
+
+def _import_numpy():
+    global numpy
+    if numpy is None:
+        import numpy
+
+
+class _ColumnView:
+    """Gives predicates of ColumnStore.mask_where the columns (vectorized) under the usual row[col] syntax."""
+    __slots__ = ("_columns",)
+
+    def __init__(self, columns):
+        self._columns = columns
+
+    def __getitem__(self, col):
+        return self._columns[col]
+
+
+class ColumnStore:
+    """
+    A table stored by column. Integer columns hold ints, the others strings.
+    Masks returned by the methods are NumPy boolean arrays or lists of bools (without NumPy);
+    either way they can be passed back to the other methods.
+    """
+
+    def __init__(self, columns):
+        self._int_columns = frozenset([col for col in range(len(columns)) if isinstance(columns[col], array)])
+        self._length = len(columns[0]) if columns else 0
+        if HAS_NUMPY:
+            _import_numpy()
+            self._columns = [numpy.frombuffer(column, dtype=numpy.int64) if isinstance(column, array)
+                             else numpy.array(column, dtype=object) for column in columns]
+        else:
+            self._columns = [column.tolist() if isinstance(column, array) else column for column in columns]
+
+    @classmethod
+    def from_table(cls, table, int_columns):
+        """Builds a column store from a list of rows, converting the given columns to integers."""
+        width = len(table[0]) if len(table) > 0 else 0
+        columns = [array("q", [int(row[col]) for row in table]) if col in int_columns
+                   else [row[col] for row in table] for col in range(width)]
+        return cls(columns)
+
+    @classmethod
+    def from_file(cls, file_name):
+        """
+        Loads a data file by column. If the file has an up to date columnar copy
+        (data_manager.export_columnar), no text is parsed at all.
+        """
+        return cls(data_manager.get_columns_from_file(file_name))
+
+    def __len__(self):
+        return self._length
+
+    def column(self, col):
+        """Returns a whole column (NumPy array or list)."""
+        return self._columns[col]
+
+    def is_int_column(self, col):
+        """Tells if the column holds integers."""
+        return col in self._int_columns
+
+    def equals(self, col, value):
+        """Returns the mask of the rows whose cell in the column equals value."""
+        if HAS_NUMPY:
+            return self._columns[col] == value
+        return [cell == value for cell in self._columns[col]]
+
+    def mask_where(self, predicate):
+        """
+        Returns the mask of the rows the predicate holds for. The predicate gets a row-like object and may
+        only use arithmetic and comparisons on its cells, e.g. lambda row: row[1] + row[2] > 2017, so that
+        it can run on whole columns at once.
+        """
+        if HAS_NUMPY:
+            return numpy.asarray(predicate(_ColumnView(self._columns)), dtype=bool)
+        return [bool(predicate(row)) for row in self.rows()]
+
+    def sign(self, col, positive, negative):
+        """Returns +1 for the rows with the positive value in the column, -1 for the negative value, 0 otherwise."""
+        if HAS_NUMPY:
+            column = self._columns[col]
+            return (column == positive).astype(numpy.int64) - (column == negative).astype(numpy.int64)
+        return [1 if cell == positive else -1 if cell == negative else 0 for cell in self._columns[col]]
+
+    def size(self, mask=None):
+        """Returns the number of rows in the mask (or in the table)."""
+        if mask is None:
+            return self._length
+        if HAS_NUMPY:
+            return int(numpy.count_nonzero(mask))
+        return len([selected for selected in mask if selected])
+
+    def total(self, col, mask=None, weights=None):
+        """Adds up an integer column, optionally multiplied by weights and restricted to a mask."""
+        values = self._columns[col]
+        if HAS_NUMPY:
+            if weights is not None:
+                values = values * weights
+            if mask is not None:
+                values = values[mask]
+            return int(values.sum())
+        result = 0
+        for position in range(self._length):
+            if mask is None or mask[position]:
+                result += values[position] if weights is None else values[position] * weights[position]
+        return result
+
+    def group_total(self, key_col, col, weights=None):
+        """Adds up an integer column (optionally multiplied by weights) per distinct value of key_col."""
+        values = self._columns[col]
+        if HAS_NUMPY:
+            if weights is not None:
+                values = values * weights
+            keys, groups = numpy.unique(self._columns[key_col], return_inverse=True)
+            totals = numpy.zeros(len(keys), dtype=numpy.int64)
+            numpy.add.at(totals, groups, values)
+            return dict(zip(keys.tolist(), totals.tolist()))
+        totals = {}
+        keys = self._columns[key_col]
+        for position in range(self._length):
+            value = values[position] if weights is None else values[position] * weights[position]
+            totals[keys[position]] = totals.get(keys[position], 0) + value
+        return totals
+
+    def nearest(self, col, target):
+        """Returns the mask of the rows whose integer cell in the column is closest to target."""
+        if HAS_NUMPY:
+            distances = numpy.abs(self._columns[col] - target)
+            return distances == distances.min()
+        distances = [abs(cell - target) for cell in self._columns[col]]
+        closest = min(distances)
+        return [distance == closest for distance in distances]
+
+    def values(self, col, mask=None):
+        """Returns the cells of a column (as a list), optionally only the ones in the mask."""
+        column = self._columns[col]
+        if HAS_NUMPY:
+            return (column if mask is None else column[mask]).tolist()
+        return [column[position] for position in range(self._length) if mask is None or mask[position]]
+
+    def rows(self, mask=None):
+        """Returns the rows (as lists of typed cells), optionally only the ones in the mask."""
+        columns = [self.values(col, mask) for col in range(len(self._columns))]
+        return [list(row) for row in zip(*columns)]
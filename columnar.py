@@ -0,0 +1,178 @@
+"""
+Compact, column-oriented binary storage for the module tables, next to the semicolon separated csv files.
+
+File layout (all numbers little-endian):
+    magic           b"ERPCOL1\n"
+    header          rows (uint32), columns (uint32), csv mtime in ns (int64), csv size (int64)
+    every column    type byte, then
+                    b"i": rows * int64 values
+                    b"s": number of distinct strings (uint32), every string as length (uint32) + utf-8 bytes,
+                          then rows * uint32 codes pointing into the strings
+
+A column is stored as integers only if every cell is the canonical text of an integer ("12", "-3"),
+so converting back to csv gives the very same text.
+"""
+
+import os
+import struct
+import sys
+from array import array
+
+MAGIC = b"ERPCOL1\n"
+SUFFIX = ".col"
+
+_HEADER = struct.Struct("<IIqq")
+_LENGTH = struct.Struct("<I")
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+
+def columnar_file_name(csv_file_name):
+    """Returns the name of the columnar file that belongs to a csv file, e.g. sales/sales.col."""
+    return os.path.splitext(csv_file_name)[0] + SUFFIX
+
+
+def __int_column(cells):
+    """Returns the cells as an int64 array if all of them are canonical integers, None otherwise."""
+    values = array("q")
+    for cell in cells:
+        try:
+            value = int(cell)
+        except ValueError:
+            return None
+        if str(value) != cell or not _INT64_MIN <= value <= _INT64_MAX:
+            return None
+        values.append(value)
+    return values
+
+
+def __little_endian(values):
+    """Returns the array in little-endian byte order."""
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def table_to_columns(table):
+    """
+    Converts a list of rows of strings into a list of columns.
+    Integer columns become array("q") objects, the others stay lists of strings.
+    """
+    if not table:
+        return []
+    width = len(table[0])
+    for row in table:
+        if len(row) != width:
+            raise ValueError("Every row must have the same number of columns to be stored by column.")
+
+    columns = []
+    for col in range(width):
+        cells = [row[col] for row in table]
+        int_values = __int_column(cells)
+        columns.append(int_values if int_values is not None else cells)
+    return columns
+
+
+def columns_to_table(columns):
+    """Converts columns (see table_to_columns) back to a list of rows of strings."""
+    if not columns:
+        return []
+    text_columns = [[str(value) for value in column] if isinstance(column, array) else column
+                    for column in columns]
+    return [list(row) for row in zip(*text_columns)]
+
+
+def write_columns(file_name, columns, source_signature=(0, 0)):
+    """
+    Writes columns (see table_to_columns) into a columnar file.
+
+    Args:
+        file_name (str): name of the columnar file
+        columns: list of array("q") / list of str columns of equal length
+        source_signature: (mtime in ns, size) of the csv file the columns were made from
+    """
+    rows = len(columns[0]) if columns else 0
+    parts = [MAGIC, _HEADER.pack(rows, len(columns), source_signature[0], source_signature[1])]
+
+    for column in columns:
+        if isinstance(column, array):
+            parts.append(b"i")
+            parts.append(__little_endian(column).tobytes())
+        else:
+            codes = array("I")
+            dictionary = {}
+            for cell in column:
+                if cell not in dictionary:
+                    dictionary[cell] = len(dictionary)
+                codes.append(dictionary[cell])
+            parts.append(b"s")
+            parts.append(_LENGTH.pack(len(dictionary)))
+            for cell in dictionary:
+                encoded = cell.encode("utf-8")
+                parts.append(_LENGTH.pack(len(encoded)))
+                parts.append(encoded)
+            parts.append(__little_endian(codes).tobytes())
+
+    temp_name = file_name + ".tmp"
+    with open(temp_name, "wb") as file:
+        file.write(b"".join(parts))
+    os.replace(temp_name, file_name)
+
+
+def read_header(file_name):
+    """Returns the (rows, columns, (csv mtime in ns, csv size)) header of a columnar file."""
+    with open(file_name, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is not a columnar table file.".format(file_name))
+        rows, cols, mtime, size = _HEADER.unpack(file.read(_HEADER.size))
+    return rows, cols, (mtime, size)
+
+
+def read_columns(file_name):
+    """
+    Reads a columnar file.
+
+    Returns:
+        A list of columns: array("q") for integer columns and lists of strings for the others.
+        The strings of a column are shared objects, so repeated values cost no extra memory.
+    """
+    with open(file_name, "rb") as file:
+        data = file.read()
+    if not data.startswith(MAGIC):
+        raise ValueError("{} is not a columnar table file.".format(file_name))
+
+    offset = len(MAGIC)
+    rows, cols, _, _ = _HEADER.unpack_from(data, offset)
+    offset += _HEADER.size
+
+    columns = []
+    for _ in range(cols):
+        column_type = data[offset:offset + 1]
+        offset += 1
+        if column_type == b"i":
+            values = array("q")
+            values.frombytes(data[offset:offset + rows * values.itemsize])
+            offset += rows * values.itemsize
+            columns.append(__little_endian(values))
+        elif column_type == b"s":
+            (count,) = _LENGTH.unpack_from(data, offset)
+            offset += _LENGTH.size
+            dictionary = []
+            for _ in range(count):
+                (length,) = _LENGTH.unpack_from(data, offset)
+                offset += _LENGTH.size
+                dictionary.append(data[offset:offset + length].decode("utf-8"))
+                offset += length
+            codes = array("I")
+            codes.frombytes(data[offset:offset + rows * codes.itemsize])
+            offset += rows * codes.itemsize
+            columns.append([dictionary[code] for code in __little_endian(codes)])
+        else:
+            raise ValueError("Unknown column type {!r} in {}.".format(column_type, file_name))
+    return columns
+
+
+def read_table(file_name):
+    """Reads a columnar file as a list of rows of strings, just like a csv file."""
+    return columns_to_table(read_columns(file_name))
@@ -1,6 +1,8 @@
-from random import choice
+from random import choice, shuffle
+from heapq import heapify, heappushpop
 import ui
 import data_manager
+from tables import IndexedTable, date_ordinal, record_type, to_rows
 
 CHR_TYPES = {"uppercase": "ABCDEFGHIJKLMNOPQRSTUVWXYZ",
              "lowercase": "abcdefghijklmnopqrstuvwxyz",
@@ -33,6 +35,11 @@ def index_of(item, in_list):
     return -1
 
 
+def _has_id_lookup(table):
+    """Tells if the table looks rows up by ID itself (IndexedTable, MappedTable, SqliteTable)."""
+    return hasattr(table, "get_by_id")
+
+
 def id_exists(table, id_to_find):
     """
     Checks if an id already exists in the table.
@@ -44,7 +51,12 @@ def id_exists(table, id_to_find):
     Returns:
         True, if the ID is found in the table. False if not.
     """
-    return id_to_find in [row[0] for row in table]
+    if _has_id_lookup(table):
+        return table.has_id(id_to_find)
+    for row in table:
+        if row[0] == id_to_find:
+            return True
+    return False
 
 
 def index_of_value(table, col, value):
@@ -80,9 +92,156 @@ def index_of_id(table, id_to_find):
     Returns:
         The index of the id, or -1 if not found.
     '''
+    if _has_id_lookup(table):
+        return table.position_of(id_to_find)
     return index_of_value(table, 0, id_to_find)
 
 
+def get_row_by_id(table, id_to_find):
+    """
+    Returns the row with the given ID, or None if not found. Tables with an ID lookup (IndexedTable,
+    MappedTable, SqliteTable) are asked directly, without going through a row number.
+    """
+    if _has_id_lookup(table):
+        return table.get_by_id(id_to_find)
+    for row in table:
+        if row[0] == id_to_find:
+            return row
+    return None
+
+
+def group_rows(table, col):
+    """
+    Groups the rows of the table by the value of one of its columns, in a single pass.
+
+    Args:
+        table: a list in a list (or an IndexedTable, whose secondary index is used if declared on col)
+
+        col: the column to group by
+
+    Returns:
+        A dictionary with the distinct values of the column as keys and the list of matching rows
+        (in table order) as values.
+    """
+    if isinstance(table, IndexedTable) and table.is_indexed(col):
+        return table.groups(col)
+
+    groups = {}
+    for row in table:
+        if row[col] in groups:
+            groups[row[col]].append(row)
+        else:
+            groups[row[col]] = [row]
+    return groups
+
+
+AGGREGATE_OPS = ("count", "sum", "min", "max", "mean")
+
+
+def __initial_aggregate_state(op):
+    """Returns the starting state of an aggregate: [sum, count] for mean, None for min/max and 0 otherwise."""
+    if op == "mean":
+        return [0, 0]
+    return None if op in ("min", "max") else 0
+
+
+def group_aggregate(table, key_col, aggregates):
+    """
+    Groups the rows of the table by a column and computes aggregates per group, in a single pass. \
+    Works on any iterable of rows, so it can consume data_manager.iter_table_from_file.
+
+    Args:
+        table: a list in a list (or any iterable of rows)
+
+        key_col: the column to group by, or a function computing the group key from a row
+
+        aggregates: a dictionary of name -> (col, op) pairs, where col is a column number or a function \
+            computing the value from a row (ignored for "count"), and op is one of AGGREGATE_OPS. \
+            Values are converted with int() for every op but "count".
+
+    Returns:
+        A dictionary with the group keys as keys (in order of first appearance) and dictionaries \
+        of aggregate name -> value as values.
+    """
+    specs = []
+    for name, (col, op) in aggregates.items():
+        if op not in AGGREGATE_OPS:
+            raise ValueError("Unknown aggregate operation: {}".format(op))
+        specs.append((name, col if callable(col) or op == "count" else get_item(col), op))
+    key_of = key_col if callable(key_col) else get_item(key_col)
+
+    states = {}
+    for row in table:
+        key = key_of(row)
+        state = states.get(key)
+        if state is None:
+            state = states[key] = [__initial_aggregate_state(op) for name, getter, op in specs]
+        for position in range(len(specs)):
+            name, getter, op = specs[position]
+            if op == "count":
+                state[position] += 1
+                continue
+            value = int(getter(row))
+            if op == "sum":
+                state[position] += value
+            elif op == "mean":
+                state[position][0] += value
+                state[position][1] += 1
+            elif state[position] is None or (value < state[position] if op == "min" else value > state[position]):
+                state[position] = value
+
+    results = {}
+    for key, state in states.items():
+        results[key] = {}
+        for position in range(len(specs)):
+            name, getter, op = specs[position]
+            results[key][name] = state[position][0] / state[position][1] if op == "mean" else state[position]
+    return results
+
+
+def hash_join(left, right, left_col, right_col, left_columns=None, right_columns=None, how="inner"):
+    """
+    Joins two tables on the equality of a column of each, in O(len(left) + len(right)) time: \
+    the rows of the right table are grouped by their join column once (reusing its secondary index, if any), \
+    then every left row looks up its matches in that dictionary.
+
+    Args:
+        left: the table whose rows drive the join (any iterable of rows)
+
+        right: the table to look up matching rows in
+
+        left_col, right_col: the columns to join on
+
+        left_columns, right_columns: the columns to put into the output, all columns if None
+
+        how: "inner" drops left rows without a match, "left" keeps them with None in place of the right columns
+
+    Returns:
+        A list of tuples (the selected left columns followed by the selected right columns), in the order \
+        of the left table.
+    """
+    if right_columns is None and how == "left":
+        right_columns = range(len(right[0]) if len(right) > 0 else 0)
+    missing = None if right_columns is None else [tuple([None for col in right_columns])]
+
+    matches = {}
+    for key, rows in group_rows(right, right_col).items():
+        matches[key] = [tuple(row) if right_columns is None else tuple([row[col] for col in right_columns])
+                        for row in rows]
+
+    joined = []
+    for row in left:
+        found = matches.get(row[left_col])
+        if found is None:
+            if how != "left":
+                continue
+            found = missing
+        left_part = tuple(row) if left_columns is None else tuple([row[col] for col in left_columns])
+        for right_part in found:
+            joined.append(left_part + right_part)
+    return joined
+
+
 def qsort_table(table, col, **kwargs):
     """
     Sorts a table based on the value of one of its columns.
@@ -117,62 +276,139 @@ def deepcopy(array):
 
 def srt(array, **kwargs):
     """
-    Sorts the array using the Quicksort algorithm (with Hoare partition scheme). \
+    Sorts the array using an iterative, stable natural merge sort. The key of every item is computed \
+    only once, and already ordered stretches of the input (like date-ordered files) are merged as they are, \
+    so the cost is O(n log n) in the worst case and O(n) for sorted input. \
     The original array will not be modified.
 
     Args:
         array: The array to sort.
         kwargs: The keyword argument "key" can be used to specify a key function. \
-            The boolean value "reversed" can be used to get a reverse-ordered list.
+            The boolean value "reversed" can be used to get a reverse-ordered list. \
+            Items with equal keys keep their original order in both directions.
 
     Returns:
         The sorted array (list).
     """
-    array_copy = deepcopy(array)
-
+    items = [item for item in array]
     key = kwargs["key"] if "key" in kwargs else None
+    keys = [key(item) for item in items] if key else items
+    descending = "reversed" in kwargs and kwargs["reversed"]
+
+    return [items[position] for position in __merge_sort_positions(keys, descending)]
+
+
+def __out_of_order(first_key, second_key, descending):
+    """Tells if second_key must be placed strictly before first_key."""
+    return first_key < second_key if descending else second_key < first_key
+
+
+def __merge_sort_positions(keys, descending):
+    """Returns the positions of keys in sorted order. Only the < operator of the keys is used."""
+    length = len(keys)
+    positions = [position for position in range(length)]
+    if length < 2:
+        return positions
+
+    run_starts = [0]
+    for position in range(1, length):
+        if __out_of_order(keys[position - 1], keys[position], descending):
+            run_starts.append(position)
+    run_starts.append(length)
+
+    buffer = positions[:]
+    while len(run_starts) > 2:
+        merged_starts = [0]
+        for run in range(0, len(run_starts) - 1, 2):
+            lo, mid = run_starts[run], run_starts[run + 1]
+            hi = run_starts[run + 2] if run + 2 < len(run_starts) else mid
+            __merge(positions, buffer, keys, lo, mid, hi, descending)
+            merged_starts.append(hi)
+        if merged_starts[-1] != length:
+            merged_starts.append(length)
+        positions, buffer = buffer, positions
+        run_starts = merged_starts
+
+    return positions
+
+
+def __merge(source, target, keys, lo, mid, hi, descending):
+    """Merges the sorted source[lo:mid] and source[mid:hi] runs into target[lo:hi], keeping equal keys in order."""
+    left, right, out = lo, mid, lo
+    while left < mid and right < hi:
+        if __out_of_order(keys[source[left]], keys[source[right]], descending):
+            target[out] = source[right]
+            right += 1
+        else:
+            target[out] = source[left]
+            left += 1
+        out += 1
+    while left < mid:
+        target[out] = source[left]
+        left += 1
+        out += 1
+    while right < hi:
+        target[out] = source[right]
+        right += 1
+        out += 1
+
+
+class _TopKEntry:
+    """A kept item of top_k. Entries compare as "worse than", so the root of the heap is the first one to drop."""
+    __slots__ = ("key", "seq", "item", "largest")
+
+    def __init__(self, key, seq, item, largest):
+        self.key = key
+        self.seq = seq
+        self.item = item
+        self.largest = largest
 
-    __qsrt(array_copy, 0, len(array) - 1, key)
-
-    return array_copy if not ("reversed" in kwargs and kwargs["reversed"]) else array_copy[::-1]
-
-
-def __qsrt(array, lo, hi, key):
-    """The core qsort algorithm, see https://en.wikipedia.org/wiki/Quicksort#Algorithm"""
-    if lo < hi:
-        p = __qsrt_partition(array, lo, hi, key)
-        __qsrt(array, lo, p, key)
-        __qsrt(array, p + 1, hi, key)
-
-
-def __qsrt_keyed_value(value, key):
-    """Helper function to key values if needed."""
-    return key(value) if key else value
-
+    def __lt__(self, other):
+        if self.largest:
+            if self.key < other.key:
+                return True
+            if other.key < self.key:
+                return False
+        else:
+            if other.key < self.key:
+                return True
+            if self.key < other.key:
+                return False
+        return self.seq > other.seq
 
-def __qsrt_partition(array, lo, hi, key):
-    """Hoare partition scheme, see https://en.wikipedia.org/wiki/Quicksort#Hoare_partition_scheme"""
-    pivot = array[lo]
-    i = lo - 1
-    j = hi + 1
-    while True:
 
-        while True:
-            i = i + 1
-            if not __qsrt_keyed_value(array[i], key) < __qsrt_keyed_value(pivot, key):
-                break
+def top_k(table, n, key=None, reversed=False):
+    """
+    Returns the first n items of the table in sorted order, without sorting the whole table. \
+    Uses a bounded heap, so it runs in O(len(table) * log(n)) time with O(n) extra memory. \
+    The result is the same as srt(table, key=key, reversed=reversed)[:n].
 
-        while True:
-            j = j - 1
-            if not __qsrt_keyed_value(array[j], key) > __qsrt_keyed_value(pivot, key):
-                break
+    Args:
+        table: The items to choose from (any iterable).
+        n: The number of items to return.
+        key: A key function, just like in srt.
+        reversed: If True, the items with the largest keys are returned, largest first.
 
-        if i >= j:
-            return j
+    Returns:
+        A list with at most n items.
+    """
+    if n <= 0:
+        return []
+
+    heap = []
+    seq = 0
+    for item in table:
+        entry = _TopKEntry(key(item) if key else item, seq, item, reversed)
+        seq += 1
+        if len(heap) < n:
+            heap.append(entry)
+            if len(heap) == n:
+                heapify(heap)
+        else:
+            heappushpop(heap, entry)
 
-        temp = array[i]
-        array[i] = array[j]
-        array[j] = temp
+    kept = srt(heap, key=lambda entry: entry.seq)
+    return [entry.item for entry in srt(kept, key=lambda entry: entry.key, reversed=reversed)]
 
 
 def get_longest(table, column):
@@ -218,6 +454,16 @@ def szum_list(collection):
     return summary
 
 
+# Every generated ID has this many characters of each type in CHR_TYPES.
+ID_CHARS_PER_TYPE = 2
+
+def _random_id():
+    """Returns a random ID in the format described at generate_random."""
+    chars = [choice(CHR_TYPES[chr_type]) for chr_type in CHR_TYPES for _ in range(ID_CHARS_PER_TYPE)]
+    shuffle(chars)
+    return "".join(chars)
+
+
 def generate_random(table):
     """
     Generates a random ID with a length of 8.
@@ -227,17 +473,49 @@ def generate_random(table):
         table
     """
     while True:
-        hat = ["uppercase", "lowercase", "digit", "symbol"] * 2
-        temp_str = ""
-        for i in range(8):
-            hchoice = choice(hat)
-            temp_str += random_char(hchoice)
-            del hat[index_of(hchoice, hat)]
+        temp_str = _random_id()
         if id_exists(table, temp_str):
             continue
         return temp_str
 
 
+class IdAllocator:
+    """
+    Hands out fresh random IDs (see generate_random) for a table, checking collisions against an
+    in-memory set of the used IDs instead of the table. Meant for adding many rows at once, e.g.
+    allocator = IdAllocator(table); new_ids = allocator.batch(1000)
+    """
+
+    def __init__(self, table=()):
+        self.used = set(table.ids()) if isinstance(table, IndexedTable) else {row[0] for row in table}
+
+    def __contains__(self, id_):
+        return id_ in self.used
+
+    def reserve(self, id_):
+        """Marks an ID (e.g. of an imported row) as used. Returns False, if it was already used."""
+        if id_ in self.used:
+            return False
+        self.used.add(id_)
+        return True
+
+    def release(self, id_):
+        """Makes the ID of a removed row available again."""
+        self.used.discard(id_)
+
+    def new_id(self):
+        """Returns a fresh ID and marks it as used."""
+        while True:
+            id_ = _random_id()
+            if id_ not in self.used:
+                self.used.add(id_)
+                return id_
+
+    def batch(self, n):
+        """Returns a list of n fresh, distinct IDs and marks them as used."""
+        return [self.new_id() for _ in range(n)]
+
+
 def validate_byear(year):
     "Check if parameter is an integer and whether it's less or equal to the current year."
 
@@ -392,11 +670,17 @@ def handle_kb_interrupt(filename=None, table_to_save=None):
     """
     ui.clear_scr()
     if filename and table_to_save:
-        data_manager.write_table_to_file(filename, table_to_save)
+        data_manager.save_table(filename, table_to_save)
     ui.print_error_message("Keyboard interrupt. If you want to got back to main menu, use the menu.")
     exit()
 
 
+def log_change(table, operation, row):
+    """Records the change in the journal of the table, if it is a journaled table."""
+    if isinstance(table, IndexedTable) and table.source:
+        data_manager.log_change(table.source, operation, row, table)
+
+
 def remove_line(table, id):
     """Takes the table given as a parameter, seeks the line with the given ID and removes it."""
 
@@ -405,7 +689,9 @@ def remove_line(table, id):
         ui.print_error_message("Wrong ID!")
         return table
 
+    removed = table[index]
     del table[index]
+    log_change(table, "remove", removed)
     return table
 
 
@@ -432,6 +718,7 @@ def add_line(table, input_specifiers):
     new_item.extend(user_input)
 
     table.append(new_item)
+    log_change(table, "add", new_item)
 
     return table
 
@@ -456,7 +743,11 @@ def update_line(table, id_, input_specifiers):
 
     user_input = ui.mass_valid_in(input_specifiers, True)
 
-    apply_update_to_line(table[index], user_input)
+    if user_input is None:
+        return table
+
+    table[index] = apply_update_to_line(table[index][:], user_input)
+    log_change(table, "update", table[index])
 
     return table
 
@@ -497,27 +788,74 @@ def get_item(index):
     return func
 
 
+def date_ordinals(table, year, month, day):
+    """
+    Computes the date ordinal (see date_ordinal) of every row once.
+
+    Args:
+        table
+        year, month and day: the numbers (constant) of the columns
+
+    Returns:
+        A list of ints, one for each row of the table.
+    """
+    return [date_ordinal(row[year], row[month], row[day]) for row in table]
+
+
 def get_last_by_date(table, year, month, day, reverse=False):
     '''
-    Gets the newest or oldest entry or entries.
+    Gets the newest or oldest entry in a single pass, without copying the table.
+    Of entries with the same date, the first one in the table is returned.
+    An IndexedTable with a date index on the same columns is answered from the index by binary search;
+    there, ties are returned in the order the index keeps them (table order, unless rows were updated).
 
     Args:
         table
         year, month and day: the numbers (constant) of the columns
-        reverse: if true, gives the newest entry instead
+        reverse: if true, gives the oldest entry instead
 
     Returns:
         the row in that table
     '''
-    DAYS_SUMMED = 7
-    new_table = deepcopy(table)
-    for row in new_table:
-        row.append(str(int(row[year]) * 365 + int(row[month]) * 31 + int(row[day])))
-    return qsort_table(new_table, DAYS_SUMMED, reversed=not reverse)[0]
+    if isinstance(table, IndexedTable) and table.is_date_indexed((year, month, day)):
+        rows = table.rows_by_date()
+        if not rows:
+            raise IndexError("get_last_by_date() of an empty table")
+        if reverse:
+            return rows[0]
+        newest = date_ordinal(rows[-1][year], rows[-1][month], rows[-1][day])
+        return table.rows_between(newest, newest, inclusive=True)[0]
+
+    best_row = None
+    best_date = None
+    for row in table:
+        ordinal = date_ordinal(row[year], row[month], row[day])
+        if best_row is None or (ordinal < best_date if reverse else ordinal > best_date):
+            best_row = row
+            best_date = ordinal
+    if best_row is None:
+        raise IndexError("get_last_by_date() of an empty table")
+    return best_row
+
+
+def get_newest_by_date(table, n, year, month, day, reverse=False):
+    '''
+    Gets the n newest (or oldest) entries, newest first, without sorting the whole table (see top_k).
+
+    Args:
+        table
+        n: the number of entries to return
+        year, month and day: the numbers (constant) of the columns
+        reverse: if true, gives the oldest entries instead, oldest first
+
+    Returns:
+        a list of at most n rows of the table
+    '''
+    return top_k(table, n, key=lambda row: date_ordinal(row[year], row[month], row[day]), reversed=not reverse)
 
 
 class dtime:
-    """A lightweight date management class."""
+    """A lightweight date management class. Compares by its date ordinal (see date_ordinal)."""
     def __init__(self, year, month, day):
         if not validate_int(year):
             raise ValueError("Invalid year parameter!")
@@ -529,6 +867,7 @@ class dtime:
         self.year = int(year)
         self.month = int(month)
         self.day = int(day)
+        self.ordinal = date_ordinal(self.year, self.month, self.day)
 
     def __repr__(self):
         return "{}/{}/{}".format(self.year, self.month, self.day)
@@ -536,9 +875,7 @@ class dtime:
     def __eq__(self, other):
         if not isinstance(other, dtime):
             raise TypeError("Can only compare dtime object to other dtime objects!")
-        if self.year == other.year and self.month == other.month and self.day == other.day:
-            return True
-        return False
+        return self.ordinal == other.ordinal
 
     def __ne__(self, other):
         return not self == other
@@ -546,15 +883,7 @@ class dtime:
     def __gt__(self, other):
         if not isinstance(other, dtime):
             raise TypeError("Can only compare dtime object to other dtime objects!")
-        if self.year > other.year:
-            return True
-        elif self.year == other.year:
-            if self.month > other.month:
-                return True
-            elif self.month == other.month:
-                if self.day > other.day:
-                    return True
-        return False
+        return self.ordinal > other.ordinal
 
     def __le__(self, other):
         return not self > other
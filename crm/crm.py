@@ -10,12 +10,22 @@ import os
 import ui
 import data_manager
 import common
+import bulk
 
 ID = 0
 NAME = 1
 EMAIL = 2
 SUBSCRIBED = 3
 
+DATA_FILE = "crm/customers.csv"
+
+Customer = common.record_type("Customer", ("id", "name", "email", "subscribed"),
+                              int_columns=(SUBSCRIBED,), file_name=DATA_FILE)
+
+INPUT_DESCRIPTIONS = [("Name: ", common.validate_string),
+                      ("E-mail: ", common.validate_email),
+                      ("Subscribed? (1 for yes, 0 for no): ", common.validate_boolean)]
+
 
 def start_module():
     """Starts the module and displays its menu."""
@@ -28,8 +38,8 @@ def start_module():
                    "What is the ID of the longest name person?",
                    "Subscribed emails"]
 
-    crm_file = "crm/customers.csv"
-    crm_data = data_manager.get_table_from_file(crm_file)
+    crm_file = DATA_FILE
+    crm_data = data_manager.open_journaled_table(crm_file)
 
     ui.clear_scr()
     while True:
@@ -50,7 +60,7 @@ def start_module():
             elif option == "6":
                 menuaction_subscribed_emails(crm_data)
             elif option == "0":
-                data_manager.write_table_to_file(crm_file, crm_data)
+                data_manager.save_table(crm_file, crm_data)
                 ui.clear_scr()
                 break
             else:
@@ -98,9 +108,7 @@ def show_table(table):
 
 def add(table):
     """Asks user for input and adds it to the table. Returns table with the new record."""
-    return common.add_line(table, [("Name: ", common.validate_string),
-                                   ("E-mail: ", common.validate_email),
-                                   ("Subscribed? (1 for yes, 0 for no): ", common.validate_boolean)])
+    return common.add_line(table, INPUT_DESCRIPTIONS)
 
 
 def remove(table, id_):
@@ -108,6 +116,16 @@ def remove(table, id_):
     return common.remove_line(table, id_)
 
 
+def import_file(batch_file):
+    """Adds the rows of a csv or JSONL batch file to the data file without prompting. Returns the new IDs."""
+    return bulk.import_batch(DATA_FILE, batch_file, INPUT_DESCRIPTIONS)
+
+
+def export_file(out_file):
+    """Writes the table into a csv or JSONL file. Returns the number of exported rows."""
+    return bulk.export_table(DATA_FILE, out_file)
+
+
 def update(table, id_):
     """Updates specified record in the table. Asks users for new data. Returns table with the updated record."""
     return common.update_line(table, id_, [("Name: ", common.validate_string),
@@ -133,7 +151,7 @@ def get_subscribed_emails(table):
 
 def get_name_by_id(id):
     """Returns the name (str) of the customer with the given id (str), None in case of non-existing id."""
-    crm_data = data_manager.get_table_from_file("crm/customers.csv")
+    crm_data = data_manager.get_cached_table(DATA_FILE)
     return get_name_by_id_from_table(crm_data, id)
 
 
@@ -149,7 +167,7 @@ def get_name_by_id_from_table(table, id):
 def get_email_by_id(id):
     """Returns the e-mail (str) of the customer with the given id (str), None in case of non-existing id."""
 
-    crm_data = data_manager.get_table_from_file("crm/customers.csv")
+    crm_data = data_manager.get_cached_table(DATA_FILE)
     for line in crm_data:
         if line[ID] == id:
             return line[EMAIL]
@@ -158,5 +176,5 @@ def get_email_by_id(id):
 
 def get_all_customer_ids():
     """Returns a set of customer_ids that are present in the table."""
-    table = data_manager.get_table_from_file("crm/customers.csv")
+    table = data_manager.get_cached_table(DATA_FILE)
     return {row[ID] for row in table}
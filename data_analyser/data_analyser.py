@@ -3,6 +3,8 @@
 import os
 import ui
 import common
+import data_manager
+import sqlite_store
 
 from sales import sales
 from crm import crm
@@ -106,23 +108,27 @@ def get_the_buyer_id_spent_most_and_the_money_spent():
 def get_the_most_frequent_buyers_names(num=1):
     """Returns an ordered (descending) list of tuples of customer IDs and the number of their sales."""
     buy_frequencies = sales.get_num_of_sales_per_customer_names()
-    buy_frequencies = common.srt(buy_frequencies, key=common.get_item(1), reversed=True)
-    return buy_frequencies[:num]
+    return common.top_k(buy_frequencies, num, key=common.get_item(1), reversed=True)
 
 
 def get_the_most_frequent_buyers_ids(num=1):
     """Returns an ordered (descending) list of tuples of customer names and the number of their sales."""
     buy_frequencies = sales.get_num_of_sales_per_customer_ids()
-    buy_frequencies = common.srt(buy_frequencies.items(), key=common.get_item(1), reversed=True)
-    return buy_frequencies[:num]
+    return common.top_k(buy_frequencies.items(), num, key=common.get_item(1), reversed=True)
 
 
 def get_idle_customers():
     """Returns an ordered list of tuples of customer names and their IDs, with customers who have made no purchase."""
+    database = data_manager.sqlite_database(sales.DATA_FILE, crm.DATA_FILE)
+    if database is not None:
+        return sqlite_store.query(database, "SELECT name, id FROM {0} WHERE NOT EXISTS "
+                                  "(SELECT 1 FROM {1} WHERE {1}.customer_id = {0}.id) ORDER BY name, id".format(
+                                      sqlite_store.table_name(crm.DATA_FILE), sqlite_store.table_name(sales.DATA_FILE)))
     all_customers = crm.get_all_customer_ids()
     paying_customers = sales.get_all_customer_ids()
-    idle_customers = all_customers - paying_customers
-    return common.srt([(crm.get_name_by_id(id), id) for id in idle_customers])
+    idle_customers = [(id,) for id in all_customers - paying_customers]
+    customers = data_manager.get_cached_table(crm.DATA_FILE)
+    return common.srt(common.hash_join(idle_customers, customers, 0, crm.ID, (), (crm.NAME, crm.ID)))
 
 
 def get_buyer_emails():
@@ -134,15 +140,11 @@ def get_earliers_arrivals_contact_info(num=1):
     """Returns a list of tuples containing order arrival dates (ordered based on this parameter), 
        corresponding contact person names and phone numbers."""
     arrival_data = logistics.get__arrivals_contact_info()
-    arrival_data = common.qsort_table(arrival_data, 0)
-
-    return arrival_data if len(arrival_data) < num else arrival_data[:num]
+    return common.top_k(arrival_data, num, key=common.get_item(0))
 
 
 def get_most_expensive_orders_info(num=1):
     """Returns a list of tuples containing partner names, e-mails,
        addresses and their relevant payment (due) information."""
     orders_data = logistics.get__payment_total_contacts()
-    orders_data = common.qsort_table(orders_data, 3, reversed=True)
-
-    return orders_data if len(orders_data) < num else orders_data[:num]
+    return common.top_k(orders_data, num, key=common.get_item(3), reversed=True)
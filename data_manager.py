@@ -1,23 +1,352 @@
-# Do not modify this file
+"""
+Reading and writing the data files of the modules: a shared cache of parsed tables, journaled changes,
+atomic writes, and the optional columnar, mmap, SQLite and year-partitioned storage.
+"""
 
+import os
+from stat import S_IMODE
+import columnar
+import partitions
+import sqlite_store
+from tables import IndexedTable, Record, RECORD_TYPES, to_records
 
-def get_table_from_file(file_name):
+# Parsed tables shared by the whole process, keyed by file name.
+# Every entry is a (signature, table) pair, see __file_signature.
+_table_cache = {}
+
+# Changes of journaled tables are appended to "<file name>.journal" and folded back
+# into the csv file (compacted) once the journal holds this many entries.
+JOURNAL_SUFFIX = ".journal"
+JOURNAL_COMPACT_LIMIT = 1000
+
+# Number of entries in the journal of each file, as far as this process knows.
+_journal_lengths = {}
+
+JOURNAL_OPERATIONS = ("add", "update", "remove")
+
+# The session.TableSession of the running program, see use_session.
+_session = None
+
+# A table stored in SQLite instead of its csv file (see use_sqlite) has a marker file "<file name>.database"
+# holding the name of the database, so every process reading the file uses the database.
+SQLITE_MARKER_SUFFIX = ".database"
+
+# File name -> database of the tables known to be stored in SQLite, read from their marker files.
+_sqlite_databases = {}
+
+
+def __stat_signature(file_name):
+    """Returns the (mtime, size) pair of a file."""
+    stat = os.stat(file_name)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def __file_mode(file_name):
+    """Returns the permission bits of a file, or those a new file gets (0666 less the umask) if it is missing."""
+    try:
+        return S_IMODE(os.stat(file_name).st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+def __file_signature(file_name):
+    """
+    Returns the (mtime, size) pairs of the file and of its journal, used to detect changes.
+    A table stored only in columnar format is identified by its columnar file, a partitioned table by its
+    partition metadata, which is rewritten with every write.
+    """
+    if partitions.is_partitioned(file_name):
+        stat = os.stat(partitions.metadata_file_name(file_name))
+    elif not os.path.exists(file_name) and os.path.exists(columnar.columnar_file_name(file_name)):
+        stat = os.stat(columnar.columnar_file_name(file_name))
+    else:
+        stat = os.stat(file_name)
+    try:
+        journal_stat = os.stat(file_name + JOURNAL_SUFFIX)
+        journal_signature = journal_stat.st_mtime_ns, journal_stat.st_size
+    except FileNotFoundError:
+        journal_signature = None
+    return stat.st_mtime_ns, stat.st_size, journal_signature
+
+
+def __columnar_is_fresh(file_name):
+    """Tells if the file has a columnar copy that was made from its current content."""
+    columnar_name = columnar.columnar_file_name(file_name)
+    if not os.path.exists(columnar_name):
+        return False
+    if not os.path.exists(file_name):
+        return True
+    return columnar.read_header(columnar_name)[2] == __stat_signature(file_name)
+
+
+def __read_rows(file_name):
+    """Reads the rows of the file (from its columnar copy, if that is up to date), without the journal."""
+    database = __database_of(file_name)
+    if database is not None:
+        return sqlite_store.read_rows(database, file_name)
+    if partitions.is_partitioned(file_name):
+        return partitions.read_rows(file_name)
+    if __columnar_is_fresh(file_name):
+        return columnar.read_table(columnar.columnar_file_name(file_name))
+    with open(file_name, "r") as file:
+        lines = file.readlines()
+    return [element.replace("\n", "").split(";") for element in lines]
+
+
+def __parse_table(file_name):
+    """Reads and splits the file without consulting the cache, then applies its journal."""
+    table = __read_rows(file_name)
+
+    changes = __read_journal(file_name)
+    if not changes:
+        return table
+
+    replayed = []
+    seen = set()
+    for row in table:
+        if row[0] in changes:
+            seen.add(row[0])
+            if changes[row[0]] is not None:
+                replayed.append(changes[row[0]])
+        else:
+            replayed.append(row)
+    for id_, row in changes.items():
+        if id_ not in seen and row is not None:
+            replayed.append(row)
+    return replayed
+
+
+def __read_journal(file_name):
+    """
+    Reads the journal of the file.
+
+    Returns:
+        A dictionary of ID -> latest version of the row (None for removed rows), in the order the IDs
+        were first changed. A line cut short by a crash (no closing newline) is ignored, and so are lines
+        with an unknown operation or the wrong number of cells (see __is_valid_entry).
+    """
+    changes = {}
+    try:
+        with open(file_name + JOURNAL_SUFFIX, "r") as journal:
+            entries = journal.readlines()
+    except FileNotFoundError:
+        return changes
+
+    for entry in entries:
+        if not entry.endswith("\n"):
+            break
+        operation, _, line = entry[:-1].partition(";")
+        row = line.split(";")
+        if not __is_valid_entry(file_name, operation, row):
+            continue
+        changes[row[0]] = None if operation == "remove" else row
+    _journal_lengths[file_name] = len(entries)
+    return changes
+
+
+def __is_valid_entry(file_name, operation, row):
+    """
+    Tells if a journal entry can be replayed: a known operation with the ID alone for "remove", or a whole row
+    (as many cells as the record type of the file has fields, if it is registered) for "add" and "update".
+    """
+    if operation not in JOURNAL_OPERATIONS or not row[0]:
+        return False
+    if operation == "remove":
+        return len(row) == 1
+    record_class = RECORD_TYPES.get(file_name)
+    return record_class is None or len(row) == len(record_class.fields)
+
+
+def __cut_torn_entry(journal_name):
+    """
+    Cuts an entry left unfinished by a crash (no closing newline) off the end of the journal, so the next
+    entry does not get appended to it.
+    """
+    try:
+        with open(journal_name, "rb+") as journal:
+            size = journal.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            journal.seek(size - 1)
+            if journal.read(1) == b"\n":
+                return
+            journal.seek(0)
+            content = journal.read()
+            journal.truncate(content.rfind(b"\n") + 1)
+    except FileNotFoundError:
+        pass
+
+
+def __database_of(file_name):
+    """Returns the SQLite database storing the table of the file (see use_sqlite), or None if it is in its csv file."""
+    if not os.path.exists(file_name + SQLITE_MARKER_SUFFIX):
+        _sqlite_databases.pop(file_name, None)
+        return None
+    if file_name not in _sqlite_databases:
+        with open(file_name + SQLITE_MARKER_SUFFIX, "r") as marker:
+            _sqlite_databases[file_name] = marker.read().strip()
+    return _sqlite_databases[file_name]
+
+
+def use_session(session):
+    """
+    Makes the tables of a session.TableSession the ones modules open and read, see the session module.
+
+    Args:
+        session: the session, or None to stop using one
+
+    Returns:
+         None
+    """
+    global _session
+    _session = session
+
+
+def get_cached_table(file_name):
+    """
+    Returns the parsed table of the file, reading it only if it changed since the last read.
+    The returned table is shared between all callers, so it must not be modified.
+    If the table is open in the current session (see use_session), the session's table is returned.
+
+    Args:
+        file_name (str): name of file to read
+
+    Returns:
+         List of lists read from a file.
+    """
+    if _session is not None and _session.get(file_name) is not None:
+        return _session.get(file_name)
+    database = __database_of(file_name)
+    signature = sqlite_store.signature(database, file_name) if database else __file_signature(file_name)
+    cached = _table_cache.get(file_name)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    table = sqlite_store.read_rows(database, file_name) if database else __parse_table(file_name)
+    _table_cache[file_name] = (signature, table)
+    return table
+
+
+def invalidate_cache(file_name=None):
+    """Drops the cached table of the given file, or every cached table if no file name is given."""
+    if file_name is None:
+        _table_cache.clear()
+    else:
+        _table_cache.pop(file_name, None)
+
+
+def get_table_from_file(file_name, indexed=False, secondary=(), dates=None):
     """
     Reads csv file and returns it as a list of lists.
     Lines are rows columns are separated by ";"
 
     Args:
         file_name (str): name of file to read
+        indexed (bool): return an IndexedTable that keeps an ID -> row position index
+        secondary (tuple): columns to build secondary (non-unique) indexes on, implies indexed
+        dates (tuple): year, month and day columns to build a date index on, implies indexed
 
     Returns:
          List of lists read from a file.
     """
-    with open(file_name, "r") as file:
-        lines = file.readlines()
-    table = [element.replace("\n", "").split(";") for element in lines]
+    table = [row[:] for row in get_cached_table(file_name)]
+    if indexed or secondary or dates:
+        table = IndexedTable(table, secondary=secondary, dates=dates)
+        table.loaded_from = file_name
     return table
 
 
+def __iter_rows(file_name):
+    """Yields the rows of the file one by one, without the journal."""
+    if partitions.is_partitioned(file_name):
+        yield from partitions.iter_rows(file_name)
+        return
+    if __columnar_is_fresh(file_name):
+        yield from columnar.read_table(columnar.columnar_file_name(file_name))
+        return
+    with open(file_name, "r") as file:
+        for line in file:
+            yield line.replace("\n", "").split(";")
+
+
+def iter_table_from_file(file_name):
+    """
+    Reads csv file row by row, without loading the whole file into memory.
+    Lines are rows columns are separated by ";"
+
+    Args:
+        file_name (str): name of file to read
+
+    Returns:
+         A generator yielding the rows of the file as lists.
+    """
+    database = __database_of(file_name)
+    if database is not None:
+        yield from sqlite_store.iter_rows(database, file_name)
+        return
+    changes = __read_journal(file_name)
+    seen = set()
+    for row in __iter_rows(file_name):
+        if row[0] in changes:
+            seen.add(row[0])
+            row = changes[row[0]]
+            if row is None:
+                continue
+        yield row
+    for id_, row in changes.items():
+        if id_ not in seen and row is not None:
+            yield row
+
+
+def get_records_from_file(file_name, record_class=None):
+    """
+    Reads csv file as a list of typed records (see tables.record_type) instead of lists of strings.
+
+    Args:
+        file_name (str): name of file to read
+        record_class: the record type to use. Defaults to the type registered for the file by its module.
+
+    Returns:
+         List of records read from a file.
+    """
+    if record_class is None:
+        record_class = RECORD_TYPES[file_name]
+    return to_records(get_cached_table(file_name), record_class)
+
+
+def __text_row(record):
+    """Returns the cells of a row or record as strings."""
+    return record.to_row() if isinstance(record, Record) else record
+
+
+def open_mapped_table(file_name):
+    """
+    Opens a large, read-only (e.g. archived) csv file through mmap, see the mapped_table module.
+    Rows are only read when accessed, by row number (table[n]) or by ID (common.index_of_id works on it).
+    The row index is saved next to the file as "<file name>.idx" and only rebuilt if the file changes.
+
+    Args:
+        file_name (str): name of file to open
+
+    Returns:
+         A MappedTable. Call its close() method (or use it in a with statement) when done.
+    """
+    from mapped_table import MappedTable
+    return MappedTable(file_name)
+
+
+def __written(file_name, table):
+    """Drops the journal of a file whose table has just been written, and marks the table as saved."""
+    if os.path.exists(file_name + JOURNAL_SUFFIX):
+        os.remove(file_name + JOURNAL_SUFFIX)
+    _journal_lengths[file_name] = 0
+    if isinstance(table, IndexedTable):
+        table.loaded_from = file_name
+        table.mark_clean()
+
+
 # write a @table into a file
 #
 # @file_name: string
@@ -25,6 +354,8 @@ def get_table_from_file(file_name):
 def write_table_to_file(file_name, table):
     """
     Writes list of lists into a csv file.
+    The rows are written into a temporary file with a single write, which then replaces the original file,
+    so a crash never leaves a half-written table behind. The journal of the file is no longer needed afterwards.
 
     Args:
         file_name (str): name of file to write to
@@ -33,7 +364,337 @@ def write_table_to_file(file_name, table):
     Returns:
          None
     """
-    with open(file_name, "w") as file:
-        for record in table:
-            row = ';'.join(record)
-            file.write(row + "\n")
+    invalidate_cache(file_name)
+    if _session is not None:
+        _session.written(file_name, table)
+    database = __database_of(file_name)
+    if database is not None:
+        sqlite_store.write_rows(database, file_name, table)
+        if isinstance(table, IndexedTable):
+            table.loaded_from = file_name
+            table.mark_clean()
+        return
+    if partitions.is_partitioned(file_name):
+        year_col, dates, totals = partitions.scheme(partitions.read_metadata(file_name))
+        partitions.write_partitions(file_name, [__text_row(record) for record in table], year_col, dates, totals)
+        __written(file_name, table)
+        return
+    rows = [__text_row(record) for record in table]
+    content = "".join([';'.join(row) + "\n" for row in rows])
+
+    import tempfile
+
+    directory, base_name = os.path.split(file_name)
+    handle, temp_name = tempfile.mkstemp(prefix=base_name + ".", suffix=".tmp", dir=directory or ".")
+    try:
+        # mkstemp creates the file readable by the owner only; keep the mode the data file had.
+        os.chmod(temp_name, __file_mode(file_name))
+        with os.fdopen(handle, "w") as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_name, file_name)
+    except BaseException:
+        os.remove(temp_name)
+        raise
+    __written(file_name, table)
+
+    if os.path.exists(columnar.columnar_file_name(file_name)):
+        columnar.write_columns(columnar.columnar_file_name(file_name), columnar.table_to_columns(rows),
+                               __stat_signature(file_name))
+
+
+def export_columnar(file_name):
+    """
+    Saves a columnar copy of the csv file (see the columnar module) next to it, e.g. sales/sales.col.
+    As long as the copy is up to date, the table is loaded from it instead of parsing the csv file,
+    and write_table_to_file keeps it up to date.
+
+    Args:
+        file_name (str): name of the csv file
+
+    Returns:
+         The name of the columnar file.
+    """
+    columnar_name = columnar.columnar_file_name(file_name)
+    columnar.write_columns(columnar_name, columnar.table_to_columns(__read_rows(file_name)),
+                           __stat_signature(file_name))
+    return columnar_name
+
+
+def import_columnar(file_name):
+    """
+    Writes the csv file back from its columnar copy.
+
+    Args:
+        file_name (str): name of the csv file (the columnar file name is derived from it)
+
+    Returns:
+         None
+    """
+    write_table_to_file(file_name, columnar.read_table(columnar.columnar_file_name(file_name)))
+
+
+def get_columns_from_file(file_name):
+    """
+    Reads the table of the file by column, with integer columns already converted.
+    Skips text parsing entirely if the file has an up to date columnar copy and no journal.
+
+    Args:
+        file_name (str): name of the csv file
+
+    Returns:
+         A list of columns: array("q") for integer columns, lists of strings for the others.
+    """
+    if __database_of(file_name) is None and not partitions.is_partitioned(file_name) \
+            and __columnar_is_fresh(file_name) and not os.path.exists(file_name + JOURNAL_SUFFIX):
+        return columnar.read_columns(columnar.columnar_file_name(file_name))
+    return columnar.table_to_columns(get_cached_table(file_name))
+
+
+def open_journaled_table(file_name, secondary=(), dates=None):
+    """
+    Reads the file into an IndexedTable whose changes made through common.add_line, update_line and
+    remove_line are recorded in the journal of the file, see log_change.
+    In a session (see use_session) the file is read only once and every call returns the same table.
+
+    Args:
+        file_name (str): name of file to read
+        secondary (tuple): columns to build secondary indexes on
+        dates (tuple): year, month and day columns to build a date index on
+
+    Returns:
+         IndexedTable read from the file (with its journal applied).
+    """
+    if _session is not None:
+        return _session.open(file_name, secondary, dates)
+    table = get_table_from_file(file_name, indexed=True, secondary=secondary, dates=dates)
+    table.source = file_name
+    return table
+
+
+def log_change(file_name, operation, row, table=None):
+    """
+    Appends a change to the journal of the file. Costs O(1) instead of rewriting the whole table.
+    A table stored in SQLite (see use_sqlite) gets the change applied right away instead.
+
+    Args:
+        file_name (str): name of the file the changed table belongs to
+        operation (str): "add", "update" or "remove"
+        row: the new version of the row, or the removed row
+        table: the complete, current table. If given, the journal is compacted into the file
+            when it grows over JOURNAL_COMPACT_LIMIT entries.
+
+    Returns:
+         None
+    """
+    log_changes(file_name, operation, [row], table)
+
+
+def log_changes(file_name, operation, rows, table=None):
+    """
+    Appends the same change of several rows to the journal of the file in a single write, see log_change.
+
+    Args:
+        file_name (str): name of the file the changed table belongs to
+        operation (str): "add", "update" or "remove"
+        rows: the new versions of the rows, or the removed rows
+        table: the complete, current table, to compact the journal into the file when it is due
+
+    Returns:
+         None
+    """
+    database = __database_of(file_name)
+    if database is not None:
+        sqlite_store.apply_changes(database, file_name, operation, [__text_row(row) for row in rows])
+        return
+    entries = "".join([operation + ";" + (row[0] if operation == "remove" else ';'.join(__text_row(row))) + "\n"
+                       for row in rows])
+    __cut_torn_entry(file_name + JOURNAL_SUFFIX)
+    with open(file_name + JOURNAL_SUFFIX, "a") as journal:
+        journal.write(entries)
+        journal.flush()
+        os.fsync(journal.fileno())
+    _journal_lengths[file_name] = _journal_lengths.get(file_name, 0) + len(rows)
+
+    if table is not None and _journal_lengths[file_name] >= JOURNAL_COMPACT_LIMIT:
+        write_table_to_file(file_name, table)
+
+
+def append_rows(file_name, rows):
+    """
+    Adds rows at the end of the table of the file as "add" entries of its journal, written at once (see
+    log_changes), instead of rewriting the whole file. The journal is compacted if that makes it due.
+    A table open in the current session (see use_session) gets the rows as well.
+
+    Args:
+        file_name (str): name of the file
+        rows: the new rows, with their IDs
+
+    Returns:
+         None
+    """
+    if not rows:
+        return
+    if _session is not None and _session.get(file_name) is not None:
+        _session.get(file_name).extend(rows)
+    log_changes(file_name, "add", rows)
+    if __database_of(file_name) is None and journal_is_due(file_name):
+        write_table_to_file(file_name, get_cached_table(file_name))
+
+
+def journal_is_due(file_name):
+    """Tells if the journal of the file holds enough entries to be compacted into the file."""
+    return _journal_lengths.get(file_name, 0) >= JOURNAL_COMPACT_LIMIT
+
+
+def save_table(file_name, table):
+    """
+    Saves the table at the exit of a module, skipping the write if nothing needs to be written:
+    an IndexedTable read from the file (see get_table_from_file) that was not changed since, or a journaled
+    table (see open_journaled_table), which is already saved change by change, unless its journal is worth
+    compacting. Tables of the current session are written back by the session when it is closed.
+
+    Args:
+        file_name (str): name of file to write to
+        table: list of lists to write to a file
+
+    Returns:
+         None
+    """
+    if _session is not None and _session.get(file_name) is table:
+        return
+    if not journal_is_due(file_name) and isinstance(table, IndexedTable):
+        if table.source == file_name or (table.loaded_from == file_name and not table.is_dirty()):
+            return
+    write_table_to_file(file_name, table)
+
+
+def use_sqlite(file_name, database=sqlite_store.DATABASE_FILE, secondary=(), dates=None):
+    """
+    Stores the table of a data file in SQLite from now on, see the sqlite_store module. If the table is not
+    stored there yet, the SQL table is created (or emptied) and filled from the csv file (with its journal),
+    and a marker file next to the data file records the choice, so every later process reads and writes the
+    SQL table as well; the csv file itself is left alone until use_csv. The module of the file must be imported.
+
+    Args:
+        file_name (str): name of the data file, e.g. sales.DATA_FILE
+        database (str): the SQLite database file
+        secondary (tuple): columns to index, e.g. the module's SECONDARY_INDEXES
+        dates (tuple): year, month and day columns to index by date, e.g. the module's DATE_COLUMNS
+
+    Returns:
+         None
+    """
+    sqlite_store.create_table(database, file_name, secondary, dates)
+    if __database_of(file_name) == database:
+        return
+    sqlite_store.write_rows(database, file_name, get_cached_table(file_name))
+    with open(file_name + SQLITE_MARKER_SUFFIX, "w") as marker:
+        marker.write(database + "\n")
+    _sqlite_databases[file_name] = database
+    invalidate_cache(file_name)
+
+
+def use_csv(file_name):
+    """
+    Stores the table of a data file in its csv file again, writing the rows of the SQL table into it and
+    removing the marker of use_sqlite.
+
+    Args:
+        file_name (str): name of the data file
+
+    Returns:
+         None
+    """
+    if __database_of(file_name) is None:
+        return
+    table = get_cached_table(file_name)
+    os.remove(file_name + SQLITE_MARKER_SUFFIX)
+    _sqlite_databases.pop(file_name, None)
+    write_table_to_file(file_name, table)
+
+
+def sqlite_database(*file_names):
+    """Returns the database storing the tables of all the given data files, or None if they are not in one."""
+    databases = {__database_of(file_name) for file_name in file_names}
+    return databases.pop() if len(databases) == 1 else None
+
+
+def open_sqlite_table(file_name):
+    """
+    Opens a table stored in SQLite (see use_sqlite) as a sqlite_store.SqliteTable. Queries of the modules
+    given such a table run in SQL instead of reading the whole table.
+
+    Args:
+        file_name (str): name of the data file
+
+    Returns:
+         A SqliteTable.
+    """
+    return sqlite_store.SqliteTable(__database_of(file_name), file_name)
+
+
+def use_partitions(file_name, year_col, dates=None, totals=None):
+    """
+    Stores the table of a data file in one file per year from now on, see the partitions module. Unless the
+    table is partitioned that way already, the partitions and their metadata are written from the current
+    table (with its journal). The metadata file marks the table as partitioned for every process: every
+    function of this module then reads and writes the partitions instead of the csv file, the rows coming in
+    year order. The csv file itself is left alone until use_unpartitioned.
+
+    Args:
+        file_name (str): name of the data file, e.g. sales.DATA_FILE
+        year_col (int): the column holding the year
+        dates (tuple): year, month and day columns, for the date range of the partitions, e.g. the module's DATE_COLUMNS
+        totals (dict): name -> module level function of a row returning the number to total per partition,
+            e.g. the module's PARTITION_TOTALS
+
+    Returns:
+         None
+    """
+    totals = totals or {}
+    metadata = partitions.load_metadata(file_name)
+    if metadata is not None and metadata["year_col"] == year_col and \
+            metadata["dates"] == (list(dates) if dates is not None else None) and \
+            metadata["totals"] == {name: partitions.function_path(function) for name, function in totals.items()}:
+        return
+    table = get_cached_table(file_name)
+    partitions.write_partitions(file_name, [__text_row(record) for record in table], year_col, dates, totals)
+    invalidate_cache(file_name)
+    __written(file_name, table)
+
+
+def use_unpartitioned(file_name):
+    """
+    Stores the table of a data file in its csv file again, writing the rows of the partitions into it and
+    removing the partition files and their metadata.
+
+    Args:
+        file_name (str): name of the data file
+
+    Returns:
+         None
+    """
+    if not partitions.is_partitioned(file_name):
+        return
+    table = get_cached_table(file_name)
+    partitions.remove_partitions(file_name)
+    write_table_to_file(file_name, table)
+
+
+def open_partitioned_table(file_name):
+    """
+    Opens a partitioned table (see use_partitions) as a partitions.PartitionedTable. Its pending journal is
+    compacted into the partitions first, so the partition metadata is up to date. Queries of the modules
+    given such a table only read the partitions of the years they need, or only the metadata.
+
+    Args:
+        file_name (str): name of the data file
+
+    Returns:
+         A PartitionedTable.
+    """
+    if os.path.exists(file_name + JOURNAL_SUFFIX):
+        write_table_to_file(file_name, get_cached_table(file_name))
+    return partitions.PartitionedTable(file_name)
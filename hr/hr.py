@@ -9,11 +9,21 @@ import os
 import ui
 import data_manager
 import common
+import bulk
+import column_store
 
 ID = 0
 NAME = 1
 B_YEAR = 2
 
+DATA_FILE = "hr/persons.csv"
+
+Person = common.record_type("Person", ("id", "name", "birth_year"),
+                            int_columns=(B_YEAR,), file_name=DATA_FILE)
+
+INPUT_DESCRIPTIONS = [("Name: ", None),
+                      ("Birth year: ", common.validate_byear)]
+
 
 def start_module():
     """Starts the module and displays its menu."""
@@ -25,8 +35,8 @@ def start_module():
                "Show Oldest Person",
                "Show Persons Closest to Average Age"]
 
-    hr_file = "hr/persons.csv"
-    hr_data = data_manager.get_table_from_file(hr_file)
+    hr_file = DATA_FILE
+    hr_data = data_manager.open_journaled_table(hr_file)
     ui.clear_scr()
 
     while True:
@@ -47,7 +57,7 @@ def start_module():
             elif option == "6":
                 menuaction_ppl_closest_to_avg(hr_data)
             elif option == "0":
-                data_manager.write_table_to_file(hr_file, hr_data)
+                data_manager.save_table(hr_file, hr_data)
                 ui.clear_scr()
                 break
             else:
@@ -95,9 +105,7 @@ def show_table(table):
 
 def add(table):
     """Asks user for input and adds it to the table. Returns table with the new record."""
-    return common.add_line(table, [("Name: ", None),
-                                   ("Birth year: ", common.validate_byear)
-                                   ])
+    return common.add_line(table, INPUT_DESCRIPTIONS)
 
 
 def remove(table, id_):
@@ -105,6 +113,16 @@ def remove(table, id_):
     return common.remove_line(table, id_)
 
 
+def import_file(batch_file):
+    """Adds the rows of a csv or JSONL batch file to the data file without prompting. Returns the new IDs."""
+    return bulk.import_batch(DATA_FILE, batch_file, INPUT_DESCRIPTIONS)
+
+
+def export_file(out_file):
+    """Writes the table into a csv or JSONL file. Returns the number of exported rows."""
+    return bulk.export_table(DATA_FILE, out_file)
+
+
 def update(table, id_):
     """Updates specified record in the table. Asks users for new data. Returns table with the updated record."""
     return common.update_line(table, id_, [("Name: ", None),
@@ -120,7 +138,12 @@ def get_oldest_person(table):
 
 
 def get_persons_closest_to_average(table):
-    """Returns a list of the people closest to the average age in the group."""
+    """Returns a list of the people closest to the average age in the group.
+       The table can also be a column_store.ColumnStore for vectorized evaluation."""
+
+    if isinstance(table, column_store.ColumnStore):
+        average_age = table.total(B_YEAR) // len(table)
+        return table.values(NAME, table.nearest(B_YEAR, average_age))
 
     average_age = common.szum(table, B_YEAR) // len(table)
     closest_age = min([abs(average_age - int(person[B_YEAR])) for person in table])
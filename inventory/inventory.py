@@ -11,6 +11,8 @@ import os
 import ui
 import data_manager
 import common
+import bulk
+import column_store
 
 ID = 0
 NAME = 1
@@ -18,6 +20,11 @@ MANUFACTURER = 2
 PURCHASE_DATE = 3
 DURABILITY = 4
 
+DATA_FILE = "inventory/inventory.csv"
+
+Item = common.record_type("Item", ("id", "name", "manufacturer", "purchase_year", "durability"),
+                          int_columns=(PURCHASE_DATE, DURABILITY), file_name=DATA_FILE)
+
 INVENTORY_INPUT_SPECIFIERS = [("Name:", common.validate_string),
                               ("Manufacturer:", common.validate_string),
                               ("Purchase year: ", common.validate_byear),
@@ -69,8 +76,8 @@ def menuaction_available_items(table):
 def start_module():
     """Starts the module and displays its menu."""
 
-    inv_file = "inventory/inventory.csv"
-    table = data_manager.get_table_from_file(inv_file)
+    inv_file = DATA_FILE
+    table = data_manager.open_journaled_table(inv_file)
 
     menuitem = -1
     try:
@@ -99,7 +106,7 @@ def start_module():
     except (KeyboardInterrupt, EOFError):  # Ctrl-C, Ctrl-D
         common.handle_kb_interrupt(inv_file, table)
     finally:
-        data_manager.write_table_to_file(inv_file, table)
+        data_manager.save_table(inv_file, table)
 
 
 def show_table(table):
@@ -117,26 +124,33 @@ def remove(table, id_):
     return common.remove_line(table, id_)
 
 
+def import_file(batch_file):
+    """Adds the rows of a csv or JSONL batch file to the data file without prompting. Returns the new IDs."""
+    return bulk.import_batch(DATA_FILE, batch_file, INVENTORY_INPUT_SPECIFIERS)
+
+
+def export_file(out_file):
+    """Writes the table into a csv or JSONL file. Returns the number of exported rows."""
+    return bulk.export_table(DATA_FILE, out_file)
+
+
 def update(table, id_):
     """Updates specified record in the table. Asks users for new data. Returns table with the updated record."""
     return common.update_line(table, id_, INVENTORY_INPUT_SPECIFIERS)
 
 
 def get_available_items(table):
-    """Gets the table for items that have not exceeded their durability."""
+    """Gets the table for items that have not exceeded their durability.
+       The table can also be a column_store.ColumnStore for vectorized evaluation."""
     current_year = common.CURRENT_YEAR
 
+    if isinstance(table, column_store.ColumnStore):
+        return table.rows(table.mask_where(lambda row: current_year - row[PURCHASE_DATE] < row[DURABILITY]))
+
     return [row for row in table if current_year - int(row[PURCHASE_DATE]) < int(row[DURABILITY])]
 
 
 def get_average_durability_by_manufacturers(table):
     """Gets the average durability for each manufacturer."""
-    manufacturers = {row[MANUFACTURER] for row in table}
-
-    durability_by_manufacturers = {}
-
-    for manufacturer in manufacturers:
-        durabilities = [int(row[DURABILITY]) for row in table if row[MANUFACTURER] == manufacturer]
-        durability_by_manufacturers[manufacturer] = common.szum_list(durabilities) / len(durabilities)
-
-    return durability_by_manufacturers
+    averages = common.group_aggregate(table, MANUFACTURER, {"durability": (DURABILITY, "mean")})
+    return {manufacturer: aggregates["durability"] for manufacturer, aggregates in averages.items()}
@@ -12,6 +12,9 @@ import os
 import ui
 import data_manager
 import common
+import bulk
+import parallel
+import sqlite_store
 
 from partners import partners
 
@@ -25,6 +28,25 @@ MONTH = 6
 DAY = 7
 PARTNER_ID = 8
 
+DATE_COLUMNS = (YEAR, MONTH, DAY)
+SECONDARY_INDEXES = (PARTNER_ID,)
+
+DATA_FILE = "logistics/orders.csv"
+
+Order = common.record_type("Order", ("id", "title", "amount", "price", "retailer",
+                                     "year", "month", "day", "partner_id"),
+                           int_columns=(AMOUNT, PRICE, YEAR, MONTH, DAY), file_name=DATA_FILE)
+
+INPUT_DESCRIPTIONS = [("Title: ", common.validate_string),
+                      ("Amount: ", common.validate_int),
+                      ("Price per Item: ", common.validate_int),
+                      ("Retailer: ", common.validate_string),
+                      ("Year of arrival: ", common.validate_fyear),
+                      ("Month of arrival: ", common.validate_month),
+                      ("Day of arrival: ", common.validate_day)]
+# Batches (see import_file) also carry the partner of every order.
+IMPORT_DESCRIPTIONS = INPUT_DESCRIPTIONS + [("Partner ID: ", common.validate_id_possible)]
+
 
 def start_module():
     """Starts the module and displays its menu."""
@@ -38,8 +60,8 @@ def start_module():
                "Show Contact Person for Arrivals",
                "Show Contact Information per Payment"]
 
-    logistics_file = "logistics/orders.csv"
-    order_data = data_manager.get_table_from_file(logistics_file)
+    logistics_file = DATA_FILE
+    order_data = data_manager.open_journaled_table(logistics_file, secondary=SECONDARY_INDEXES, dates=DATE_COLUMNS)
     ui.clear_scr()
 
     while True:
@@ -65,7 +87,7 @@ def start_module():
                 ui.print_table(get__payment_total_contacts(),
                                ["Partner", "E-mail", "Bank Account Number", "Payments Due"], 3, reversed=True)
             elif option == "0":
-                data_manager.write_table_to_file(logistics_file, order_data)
+                data_manager.save_table(logistics_file, order_data)
                 ui.clear_scr()
                 break
             else:
@@ -118,14 +140,7 @@ def show_table(table):
 
 def add(table):
     """Asks user for input and adds it to the table. Returns table with the new record."""
-    return common.add_line(table, [("Title: ", common.validate_string),
-                                   ("Amount: ", common.validate_int),
-                                   ("Price per Item: ", common.validate_int),
-                                   ("Retailer: ", common.validate_string),
-                                   ("Year of arrival: ", common.validate_fyear),
-                                   ("Month of arrival: ", common.validate_month),
-                                   ("Day of arrival: ", common.validate_day)
-                                   ])
+    return common.add_line(table, INPUT_DESCRIPTIONS)
 
 
 def remove(table, id_):
@@ -133,6 +148,16 @@ def remove(table, id_):
     return common.remove_line(table, id_)
 
 
+def import_file(batch_file):
+    """Adds the rows of a csv or JSONL batch file to the data file without prompting. Returns the new IDs."""
+    return bulk.import_batch(DATA_FILE, batch_file, IMPORT_DESCRIPTIONS)
+
+
+def export_file(out_file):
+    """Writes the table into a csv or JSONL file. Returns the number of exported rows."""
+    return bulk.export_table(DATA_FILE, out_file)
+
+
 def update(table, id_):
     """Updates specified record in the table. Asks users for new data. Returns table with the updated record."""
     return common.update_line(table, id_, [("Title: ", None),
@@ -148,12 +173,22 @@ def update(table, id_):
 def get_price_total_per_retailer(table, query=partners.NAME):
     """Returns a dictionary with retailers as keys and their due payments added up as values."""
 
-    r_payments = {}
+    if isinstance(table, sqlite_store.SqliteTable) and \
+            data_manager.sqlite_database(partners.DATA_FILE) == table.database:
+        payments = table.query("SELECT SUM(orders.price * orders.amount), partners.{} FROM {} AS orders "
+                               "LEFT JOIN {} AS partners ON partners.id = orders.partner_id "
+                               "GROUP BY orders.partner_id ORDER BY MIN(orders.rowid)".format(
+                                   partners.Partner.fields[query], table.name,
+                                   sqlite_store.table_name(partners.DATA_FILE)))
+    else:
+        totals_per_partner = [(partner_id, common.szum_list([int(row[PRICE]) * int(row[AMOUNT]) for row in rows]))
+                              for partner_id, rows in common.group_rows(table, PARTNER_ID).items()]
+        partner_data = data_manager.get_cached_table(partners.DATA_FILE)
+        payments = common.hash_join(totals_per_partner, partner_data, 0, partners.ID, (1,), (query,), how="left")
 
-    for row in table:
-        current_key = partners.get_info_by_id(row[PARTNER_ID], query)
-        current_sum = int(row[PRICE]) * int(row[AMOUNT])
+    r_payments = {}
 
+    for current_sum, current_key in payments:
         if current_key not in r_payments:
             r_payments[current_key] = current_sum
         else:
@@ -162,24 +197,40 @@ def get_price_total_per_retailer(table, query=partners.NAME):
     return r_payments
 
 
+def get_price_total_per_retailer_parallel(table, query=partners.NAME, workers=None):
+    """Variant of get_price_total_per_retailer adding up chunks of the table on all cores, see parallel.map_reduce."""
+    return parallel.map_reduce(get_price_total_per_retailer, table, parallel.merge_totals, workers, args=(query,))
+
+
 def date_ordered_payments(table):
     """Orders items based on their arrival dates. Returns a list of lists."""
 
-    temp_table = [[line[ID], line[TITLE], line[AMOUNT], line[PRICE], line[RETAILER],
-                   common.dtime(line[YEAR], line[MONTH], line[DAY])] for line in table]
-    return common.srt(temp_table, key=common.get_item(5))
+    if isinstance(table, common.IndexedTable) and table.is_date_indexed():
+        lines = table.rows_by_date()
+    else:
+        ordinals = common.date_ordinals(table, YEAR, MONTH, DAY)
+        lines = [table[position] for position in common.srt(range(len(table)), key=ordinals.__getitem__)]
+
+    return [[line[ID], line[TITLE], line[AMOUNT], line[PRICE], line[RETAILER],
+             common.dtime(line[YEAR], line[MONTH], line[DAY])] for line in lines]
 
 
 def get__arrivals_contact_info():
     """Returns the contact person and phone number of partner whose order arrives earliest."""
-    table = data_manager.get_table_from_file("logistics/orders.csv")
-    return [(common.dtime(row[YEAR], row[MONTH], row[DAY]),
-             *partners.get_info_by_id(row[PARTNER_ID], [partners.CONTACT_PERSON, partners.PHONE]))
-            for row in table]
+    table = data_manager.get_cached_table(DATA_FILE)
+    partner_data = data_manager.get_cached_table(partners.DATA_FILE)
+    return [(common.dtime(year, month, day), contact_person, phone)
+            for year, month, day, contact_person, phone
+            in common.hash_join(table, partner_data, PARTNER_ID, partners.ID,
+                                (YEAR, MONTH, DAY), (partners.CONTACT_PERSON, partners.PHONE))]
 
 
 def get__payment_total_contacts():
     """Returns a list of tuples with partner name, e-mail, bank account number and payments due total."""
-    table = data_manager.get_table_from_file("logistics/orders.csv")
-    return [(*partners.get_info_by_id(key, [partners.NAME, partners.EMAIL, partners.BANK_ACCOUNT]),
-             value) for key, value in get_price_total_per_retailer(table, partners.ID).items()]
+    table = data_manager.get_cached_table(DATA_FILE)
+    partner_data = data_manager.get_cached_table(partners.DATA_FILE)
+    totals = list(get_price_total_per_retailer(table, partners.ID).items())
+    return [(name, email, bank_account, value)
+            for value, name, email, bank_account
+            in common.hash_join(totals, partner_data, 0, partners.ID,
+                                (1,), (partners.NAME, partners.EMAIL, partners.BANK_ACCOUNT))]
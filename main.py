@@ -2,44 +2,54 @@ import sys
 import os
 import ui
 
-from store import store
-from hr import hr
-from inventory import inventory
-from accounting import accounting
-from sales import sales
-from crm import crm
-from logistics import logistics
-from partners import partners
-from data_analyser import data_analyser
+import time
+import importlib
+import data_manager
+import session
+
+# Menu option -> module started by it. Modules are imported on first selection only.
+MODULES = {"1": "store.store",
+           "2": "hr.hr",
+           "3": "inventory.inventory",
+           "4": "accounting.accounting",
+           "5": "sales.sales",
+           "6": "crm.crm",
+           "7": "logistics.logistics",
+           "8": "partners.partners",
+           "9": "data_analyser.data_analyser"
+           }
 
 
 def choose():
     inputs = ui.get_inputs(["Please enter a number: "], "")
     option = inputs[0]
-    if option == "1":
-        store.start_module()
-    elif option == "2":
-        hr.start_module()
-    elif option == "3":
-        inventory.start_module()
-    elif option == "4":
-        accounting.start_module()
-    elif option == "5":
-        sales.start_module()
-    elif option == "6":
-        crm.start_module()
-    elif option == "7":
-        logistics.start_module()
-    elif option == '8':
-        partners.start_module()
-    elif option == "9":
-        data_analyser.start_module()
+    if option in MODULES:
+        importlib.import_module(MODULES[option]).start_module()
     elif option == "0":
         sys.exit(0)
     else:
         raise KeyError("There is no such option.")
 
 
+def measure_startup(stream=sys.stdout):
+    """
+    Imports every module in menu order and reads its data file for the first time, writing the time
+    each step took as csv lines (module, import seconds, first load seconds) to the stream.
+    A module imported earlier by another one (e.g. crm by sales) shows only the lookup time.
+    """
+    stream.write("module,import_s,first_load_s\n")
+    for module_name in MODULES.values():
+        start = time.perf_counter()
+        module = importlib.import_module(module_name)
+        imported = time.perf_counter()
+        if hasattr(module, "DATA_FILE"):
+            data_manager.get_table_from_file(module.DATA_FILE)
+            first_load = "{:.6f}".format(time.perf_counter() - imported)
+        else:
+            first_load = ""
+        stream.write("{},{:.6f},{}\n".format(module_name, imported - start, first_load))
+
+
 def handle_menu():
     options = ["Store manager",
                "Human resources manager",
@@ -56,13 +66,28 @@ def handle_menu():
 
 
 def main():
-    while True:
-        handle_menu()
-        try:
-            choose()
-        except KeyError as err:
-            ui.print_error_message(err)
+    # The tables of the modules are loaded once per run and written back at exit, if they were changed.
+    table_session = session.TableSession()
+    data_manager.use_session(table_session)
+    try:
+        while True:
+            handle_menu()
+            try:
+                choose()
+            except KeyError as err:
+                ui.print_error_message(err)
+    finally:
+        table_session.close()
+        data_manager.use_session(None)
 
 
 if __name__ == '__main__':
+    # The data file names of the modules are relative to the directory of the program.
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if sys.argv[1:] == ["--startup-times"]:
+        measure_startup()
+        sys.exit(0)
+    if len(sys.argv) > 1:
+        import cli
+        sys.exit(cli.main(sys.argv[1:]))
     main()
@@ -0,0 +1,218 @@
+"""
+Read-only, memory-mapped access to large (archived) csv tables.
+
+The csv file is mapped into memory and a row index is kept next to it in "<file name>.idx":
+    magic           b"ERPIDX1\n"
+    header          csv mtime in ns (int64), csv size (int64), rows (uint64), ID width (uint64)
+    row offsets     rows + 1 uint64 values, the start of every row and the end of the file
+    ID entries      rows entries of (ID padded with zero bytes to the ID width, row number as uint64),
+                    ordered by ID
+
+The index is built once and rebuilt only if the csv file changes, so looking up a row by number or by ID
+touches only a few pages of either file, however large the table is. Journals are not applied.
+"""
+
+import heapq
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+
+MAGIC = b"ERPIDX1\n"
+INDEX_SUFFIX = ".idx"
+
+_HEADER = struct.Struct("<qqQQ")
+_OFFSET = struct.Struct("<Q")
+# ID length and row number of an entry in a temporary run of build_index, followed by the ID.
+_RUN_ENTRY = struct.Struct("<IQ")
+
+# Number of rows whose offsets and ID entries build_index keeps in memory at a time.
+RUN_ROWS = 1 << 20
+
+
+def _signature(file_name):
+    stat = os.stat(file_name)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _write_offsets(index_file, offsets):
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    offsets.tofile(index_file)
+
+
+def _write_run(entries):
+    """Writes sorted (ID, row number) entries into a temporary file, to be merged by build_index."""
+    run = tempfile.TemporaryFile()
+    for id_, row_number in entries:
+        run.write(_RUN_ENTRY.pack(len(id_), row_number))
+        run.write(id_)
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    while True:
+        head = run.read(_RUN_ENTRY.size)
+        if not head:
+            return
+        length, row_number = _RUN_ENTRY.unpack(head)
+        yield run.read(length), row_number
+
+
+def build_index(file_name):
+    """
+    Scans the csv file and writes its row index (see the module docstring) in a single pass, holding at most
+    RUN_ROWS offsets and ID entries in memory: the offsets are written as they are found, and the ID entries
+    are sorted in runs of RUN_ROWS that are merged into the index at the end.
+    """
+    signature = _signature(file_name)
+    temp_name = file_name + INDEX_SUFFIX + ".tmp"
+    runs = []
+    entries = []
+    offsets = array("Q")
+    rows, id_width = 0, 0
+    with open(temp_name, "wb") as index_file:
+        index_file.write(MAGIC + _HEADER.pack(0, 0, 0, 0))
+        with open(file_name, "rb") as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if signature[1] else b""
+            try:
+                start = 0
+                while start < len(data):
+                    end = data.find(b"\n", start)
+                    if end == -1:
+                        end = len(data)
+                    id_end = data.find(b";", start, end)
+                    id_ = data[start:end if id_end == -1 else id_end]
+                    id_width = max(id_width, len(id_))
+                    entries.append((id_, rows))
+                    offsets.append(start)
+                    rows += 1
+                    if len(entries) == RUN_ROWS:
+                        # The runs are sorted in C: common.srt would dominate the build time of large indexes.
+                        entries.sort()
+                        runs.append(_write_run(entries))
+                        entries = []
+                        _write_offsets(index_file, offsets)
+                        offsets = array("Q")
+                    start = end + 1
+                offsets.append(len(data))
+            finally:
+                if signature[1]:
+                    data.close()
+        _write_offsets(index_file, offsets)
+
+        entries.sort()
+        entry_format = struct.Struct("<{}sQ".format(id_width))
+        packed = []
+        for id_, row_number in heapq.merge(*[_read_run(run) for run in runs], entries):
+            packed.append(entry_format.pack(id_, row_number))
+            if len(packed) == RUN_ROWS:
+                index_file.write(b"".join(packed))
+                packed = []
+        index_file.write(b"".join(packed))
+
+        index_file.seek(len(MAGIC))
+        index_file.write(_HEADER.pack(signature[0], signature[1], rows, id_width))
+    for run in runs:
+        run.close()
+    os.replace(temp_name, file_name + INDEX_SUFFIX)
+
+
+def _index_is_fresh(file_name):
+    try:
+        with open(file_name + INDEX_SUFFIX, "rb") as index_file:
+            if index_file.read(len(MAGIC)) != MAGIC:
+                return False
+            mtime, size, _, _ = _HEADER.unpack(index_file.read(_HEADER.size))
+    except (FileNotFoundError, struct.error):
+        return False
+    return (mtime, size) == _signature(file_name)
+
+
+class MappedTable:
+    """
+    A read-only table backed by a memory-mapped csv file. Supports len(), iteration, table[row_number]
+    (returning the row as a list of strings) and lookups by ID without reading the whole file.
+    """
+
+    def __init__(self, file_name):
+        if not _index_is_fresh(file_name):
+            build_index(file_name)
+        self.file_name = file_name
+        self._file = open(file_name, "rb")
+        self._index_file = open(file_name + INDEX_SUFFIX, "rb")
+        self._data = self.__map(self._file)
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        _, _, self._rows, id_width = _HEADER.unpack_from(self._index, len(MAGIC))
+        self._offsets_start = len(MAGIC) + _HEADER.size
+        self._entries_start = self._offsets_start + (self._rows + 1) * _OFFSET.size
+        self._entry = struct.Struct("<{}sQ".format(id_width))
+
+    @staticmethod
+    def __map(file):
+        if os.fstat(file.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self._rows
+
+    def __getitem__(self, row_number):
+        if row_number < 0:
+            row_number += self._rows
+        if not 0 <= row_number < self._rows:
+            raise IndexError("MappedTable row number out of range")
+        start, end = struct.unpack_from("<QQ", self._index, self._offsets_start + row_number * _OFFSET.size)
+        line = self._data[start:end]
+        if line.endswith(b"\n"):
+            line = line[:-1]
+        return line.decode("utf-8").split(";")
+
+    def __iter__(self):
+        for row_number in range(self._rows):
+            yield self[row_number]
+
+    def position_of(self, id_):
+        """Returns the row number of the row with the given ID (binary search in the index), or -1 if not found."""
+        key = id_.encode("utf-8")
+        if len(key) > self._entry.size - _OFFSET.size:
+            return -1
+        key = key.ljust(self._entry.size - _OFFSET.size, b"\0")
+        lo, hi = 0, self._rows
+        while lo < hi:
+            mid = (lo + hi) // 2
+            entry_id, row_number = self._entry.unpack_from(self._index, self._entries_start + mid * self._entry.size)
+            if entry_id < key:
+                lo = mid + 1
+            elif key < entry_id:
+                hi = mid
+            else:
+                return row_number
+        return -1
+
+    def has_id(self, id_):
+        """Returns True, if a row with the given ID is in the table."""
+        return self.position_of(id_) != -1
+
+    def get_by_id(self, id_):
+        """Returns the row with the given ID, or None if not found."""
+        row_number = self.position_of(id_)
+        return self[row_number] if row_number != -1 else None
+
+    def close(self):
+        """Releases the mapped files."""
+        if isinstance(self._data, mmap.mmap):
+            self._data.close()
+        self._index.close()
+        self._file.close()
+        self._index_file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,86 @@
+"""
+Map-reduce style evaluation of aggregations on all cores.
+
+The table is split into chunks (the year partitions of a partitions.PartitionedTable, otherwise slices of
+about equal size), an aggregation function of a module runs on every chunk in a process pool, and the
+partial results are merged in chunk order, e.g.
+
+    parallel.map_reduce(sales.get_sum_of_sales_per_customer_from_table, table, parallel.merge_totals)
+
+The function must be defined at module level (the worker processes import it by name) and give results
+that can be merged, like the dictionaries of totals the group_aggregate based queries return.
+"""
+
+import os
+from collections import namedtuple
+
+import partitions
+
+# A partition read by the worker itself, so its rows are not sent to the worker process.
+PartitionChunk = namedtuple("PartitionChunk", ("file_name", "year"))
+
+
+def default_workers():
+    """Returns the number of worker processes used if none is given: the number of cores."""
+    return os.cpu_count() or 1
+
+
+def chunks_of(table, count):
+    """
+    Splits a table into at most count chunks of consecutive rows, or into its partitions if it is a
+    PartitionedTable. Returns the list of chunks.
+    """
+    if isinstance(table, partitions.PartitionedTable):
+        return [PartitionChunk(table.file_name, year) for year in table.years()]
+    rows = list(table)
+    size = max(1, -(-len(rows) // max(1, count)))
+    return [rows[start:start + size] for start in range(0, len(rows), size)]
+
+
+def _run(function, chunk, args):
+    """Runs the function on a chunk (in a worker process)."""
+    if isinstance(chunk, PartitionChunk):
+        chunk = partitions.read_partition(chunk.file_name, chunk.year)
+    return function(chunk, *args)
+
+
+def map_reduce(function, table, merge, workers=None, chunks=None, args=()):
+    """
+    Runs function(chunk, *args) on chunks of the table in a process pool and merges the partial results.
+
+    Args:
+        function: a module-level function taking a table (a list of rows) and returning a partial result
+        table: the rows, any iterable of rows or a PartitionedTable
+        merge: a function taking the list of partial results (in chunk order) and returning the result,
+            e.g. merge_totals
+        workers (int): number of worker processes, the number of cores if None. With 1 worker, or a single
+            chunk, everything runs in the calling process.
+        chunks (int): number of chunks to split the table into, workers if None (ignored for partitioned tables)
+        args (tuple): further arguments of the function
+
+    Returns:
+        The merged result.
+    """
+    if workers is None:
+        workers = default_workers()
+    parts = chunks_of(table, chunks or workers)
+    if workers == 1 or len(parts) <= 1:
+        return merge([_run(function, chunk, args) for chunk in parts])
+
+    # Imported here, so importing the modules that use parallel does not load concurrent.futures.
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(_run, function, chunk, args) for chunk in parts]
+        return merge([future.result() for future in futures])
+
+
+def merge_totals(partials):
+    """
+    Merges dictionaries of key -> number by adding up the numbers of the same key.
+    Keys keep the order of their first appearance.
+    """
+    totals = {}
+    for partial in partials:
+        for key, value in partial.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
@@ -0,0 +1,264 @@
+"""
+Year-partitioned storage for tables with a year column (sales, accounting).
+
+The rows of a partitioned table are stored in one csv file per year next to the data file, e.g.
+sales/sales.2016.csv, each holding the rows of that year in table order. A metadata file
+("<base>.partitions", JSON) describes the layout and summarizes every partition:
+    year_col        the year column the rows are split by
+    dates           the year, month and day columns, or null
+    totals          name -> "module:function" computing the number totalled per partition for a row
+    partitions      year -> summary:
+        rows            number of rows
+        min_date        smallest and largest date ordinal (see tables.date_ordinal) of the rows,
+        max_date        if the table has date columns
+        totals          name -> total of the function over the rows (e.g. the income and the expenses of accounting)
+        signature       mtime and size of the partition file when it was summarized
+
+data_manager.use_partitions switches a data file to this storage. From then on the metadata file marks the
+table as partitioned for every process: reading and writing it through data_manager works as before (the
+rows come in year order), and the csv file itself is no longer read. A partition changed behind the metadata's
+back (its signature differs) gets its summary rebuilt on load; a missing partition is an error. Queries given
+a PartitionedTable (data_manager.open_partitioned_table) skip the partitions outside the years they need,
+and some are answered from the metadata alone.
+"""
+
+import os
+
+from tables import date_ordinal
+
+METADATA_SUFFIX = ".partitions"
+
+
+def metadata_file_name(file_name):
+    """Returns the name of the metadata file of a data file, e.g. sales/sales.partitions."""
+    return os.path.splitext(file_name)[0] + METADATA_SUFFIX
+
+
+def partition_file_name(file_name, year):
+    """Returns the name of the partition file of a year, e.g. sales/sales.2016.csv."""
+    base, extension = os.path.splitext(file_name)
+    return "{}.{}{}".format(base, year, extension)
+
+
+def is_partitioned(file_name):
+    """Tells if the table of the data file is stored in partitions (has a metadata file)."""
+    return os.path.exists(metadata_file_name(file_name))
+
+
+def __write_metadata(file_name, metadata):
+    import json
+    __write(metadata_file_name(file_name), json.dumps(metadata, sort_keys=True))
+
+
+def __write(file_name, content):
+    temp_name = file_name + ".tmp"
+    with open(temp_name, "w") as file:
+        file.write(content)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_name, file_name)
+
+
+def __signature(file_name):
+    stat = os.stat(file_name)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def function_path(function):
+    """Returns the "module:function" name of a module level function, as stored in the metadata."""
+    return "{}:{}".format(function.__module__, function.__qualname__)
+
+
+def resolve_function(path):
+    """Returns the function named by function_path."""
+    import importlib
+    module_name, _, function_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def read_metadata(file_name):
+    """Returns the metadata of a partitioned data file as stored, or None if it is not partitioned."""
+    import json
+    try:
+        with open(metadata_file_name(file_name), "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def load_metadata(file_name):
+    """
+    Returns the metadata of a partitioned data file (None if it is not partitioned), after rebuilding the
+    summaries of the partitions whose files changed since they were summarized.
+
+    Raises:
+        ValueError: if a partition listed in the metadata is missing.
+    """
+    metadata = read_metadata(file_name)
+    if metadata is None:
+        return None
+    stale = False
+    for year, summary in metadata["partitions"].items():
+        partition_name = partition_file_name(file_name, year)
+        if not os.path.exists(partition_name):
+            raise ValueError("{} lists the missing partition {}".format(metadata_file_name(file_name), partition_name))
+        if summary["signature"] != __signature(partition_name):
+            metadata["partitions"][year] = summarize(partition_name, read_partition(file_name, year),
+                                                     metadata["dates"], scheme(metadata)[2])
+            stale = True
+    if stale:
+        __write_metadata(file_name, metadata)
+    return metadata
+
+
+def scheme(metadata):
+    """Returns the (year column, date columns, totals) layout of the metadata, the totals as functions."""
+    dates = tuple(metadata["dates"]) if metadata["dates"] is not None else None
+    return metadata["year_col"], dates, {name: resolve_function(path) for name, path in metadata["totals"].items()}
+
+
+def years_of(metadata):
+    """Returns the years of the partitions, in ascending order."""
+    years = list(metadata["partitions"])
+    # common.srt cannot be used below common, which imports this module through data_manager.
+    years.sort(key=int)
+    return years
+
+
+def summarize(partition_name, rows, dates=None, totals=None):
+    """Returns the summary of the rows of a partition file (see the module docstring)."""
+    summary = {"rows": len(rows), "min_date": None, "max_date": None, "totals": {},
+               "signature": __signature(partition_name)}
+    if dates is not None and rows:
+        year_col, month_col, day_col = dates
+        ordinals = [date_ordinal(row[year_col], row[month_col], row[day_col]) for row in rows]
+        summary["min_date"] = min(ordinals)
+        summary["max_date"] = max(ordinals)
+    for name, function in (totals or {}).items():
+        total = 0
+        for row in rows:
+            total += function(row)
+        summary["totals"][name] = total
+    return summary
+
+
+def write_partitions(file_name, table, year_col, dates=None, totals=None):
+    """
+    Splits the rows by year, writes every partition and then the metadata, and removes the partitions
+    of the years that no longer have rows.
+
+    Args:
+        file_name (str): the data file
+        table: the rows
+        year_col (int): the column to split the rows by
+        dates (tuple): year, month and day columns, for the date range of the partitions
+        totals (dict): name -> module level function of a row returning the number to total per partition
+    """
+    totals = totals or {}
+    partitions = {}
+    for row in table:
+        partitions.setdefault(row[year_col], []).append(row)
+
+    old_metadata = read_metadata(file_name)
+    metadata = {"year_col": year_col, "dates": list(dates) if dates is not None else None,
+                "totals": {name: function_path(function) for name, function in totals.items()}, "partitions": {}}
+    for year, rows in partitions.items():
+        partition_name = partition_file_name(file_name, year)
+        __write(partition_name, "".join([';'.join(row) + "\n" for row in rows]))
+        metadata["partitions"][year] = summarize(partition_name, rows, dates, totals)
+    __write_metadata(file_name, metadata)
+
+    for year in (old_metadata["partitions"] if old_metadata is not None else ()):
+        if year not in metadata["partitions"] and os.path.exists(partition_file_name(file_name, year)):
+            os.remove(partition_file_name(file_name, year))
+
+
+def remove_partitions(file_name):
+    """Removes the metadata and the partition files of a data file, so it is no longer partitioned."""
+    metadata = read_metadata(file_name)
+    if metadata is None:
+        return
+    os.remove(metadata_file_name(file_name))
+    for year in metadata["partitions"]:
+        if os.path.exists(partition_file_name(file_name, year)):
+            os.remove(partition_file_name(file_name, year))
+
+
+def read_partition(file_name, year):
+    """Returns the rows of one partition."""
+    with open(partition_file_name(file_name, year), "r") as file:
+        return [line.replace("\n", "").split(";") for line in file]
+
+
+def iter_rows(file_name):
+    """Yields the rows of every partition, the years in ascending order."""
+    metadata = load_metadata(file_name)
+    for year in years_of(metadata):
+        yield from read_partition(file_name, year)
+
+
+def read_rows(file_name):
+    """Returns the rows of every partition, the years in ascending order."""
+    return list(iter_rows(file_name))
+
+
+class PartitionedTable:
+    """
+    A read-only view of a partitioned data file. Iterating it reads every partition; partition(year)
+    reads only one, and summary(year) only looks at the metadata.
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.metadata = load_metadata(file_name)
+        self.dates = scheme(self.metadata)[1]
+
+    def __len__(self):
+        length = 0
+        for summary in self.metadata["partitions"].values():
+            length += summary["rows"]
+        return length
+
+    def __iter__(self):
+        for year in self.years():
+            yield from self.partition(year)
+
+    def years(self):
+        """Returns the years that have rows (as in the year column), in ascending order."""
+        return years_of(self.metadata)
+
+    def summary(self, year):
+        """Returns the summary of a year's partition (see the module docstring), or None if it has no rows."""
+        return self.metadata["partitions"].get(str(year))
+
+    def has_totals(self, *names):
+        """Tells if the summaries of the partitions have the totals of the given names."""
+        return set(names) <= set(self.metadata["totals"])
+
+    def partition(self, year):
+        """Returns the rows of a year."""
+        if str(year) not in self.metadata["partitions"]:
+            return []
+        return read_partition(self.file_name, str(year))
+
+    def rows_between(self, first, last):
+        """
+        Returns the rows dated strictly between two date ordinals, reading only the partitions whose
+        date range overlaps them and filtering only the partitions at the edges of the range.
+        The table must have date columns.
+        """
+        rows = []
+        for year in self.years():
+            summary = self.metadata["partitions"][year]
+            if summary["max_date"] is None or summary["max_date"] <= first or summary["min_date"] >= last:
+                continue
+            partition = self.partition(year)
+            if first < summary["min_date"] and summary["max_date"] < last:
+                rows.extend(partition)
+            else:
+                rows.extend([row for row in partition if first < self.__ordinal(row) < last])
+        return rows
+
+    def __ordinal(self, row):
+        year_col, month_col, day_col = self.dates
+        return date_ordinal(row[year_col], row[month_col], row[day_col])
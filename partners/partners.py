@@ -12,6 +12,7 @@ import os
 import ui
 import data_manager
 import common
+import bulk
 
 ID = 0
 NAME = 1
@@ -20,6 +21,17 @@ EMAIL = 3
 PHONE = 4
 BANK_ACCOUNT = 5
 
+DATA_FILE = "partners/partners.csv"
+
+Partner = common.record_type("Partner", ("id", "name", "contact_person", "email", "phone", "bank_account"),
+                             file_name=DATA_FILE)
+
+INPUT_DESCRIPTIONS = [("Name: ", common.validate_string),
+                      ("Contact Person: ", common.validate_string),
+                      ("E-mail: ", common.validate_email),
+                      ("Phone number: ", common.validate_string),
+                      ("Address: ", common.validate_string)]
+
 
 def start_module():
     """Starts the module and displays its menu."""
@@ -30,8 +42,8 @@ def start_module():
                        "Update entry",
                        "Remove entry"]
 
-    partners_file = "partners/partners.csv"
-    partner_data = data_manager.get_table_from_file(partners_file)
+    partners_file = DATA_FILE
+    partner_data = data_manager.open_journaled_table(partners_file)
     ui.clear_scr()
 
     while True:
@@ -48,7 +60,7 @@ def start_module():
             elif option == "4":
                 menuaction_remove(partner_data)
             elif option == "0":
-                data_manager.write_table_to_file(partners_file, partner_data)
+                data_manager.save_table(partners_file, partner_data)
                 ui.clear_scr()
                 break
             else:
@@ -82,11 +94,7 @@ def show_table(table):
 
 def add(table):
     """Asks user for input and adds it to the table. Returns table with the new record."""
-    return common.add_line(table, [("Name: ", common.validate_string),
-                                   ("Contact Person: ", common.validate_string),
-                                   ("E-mail: ", common.validate_email),
-                                   ("Phone number: ", common.validate_string),
-                                   ("Address: ", common.validate_string)])
+    return common.add_line(table, INPUT_DESCRIPTIONS)
 
 
 def remove(table, id_):
@@ -94,6 +102,16 @@ def remove(table, id_):
     return common.remove_line(table, id_)
 
 
+def import_file(batch_file):
+    """Adds the rows of a csv or JSONL batch file to the data file without prompting. Returns the new IDs."""
+    return bulk.import_batch(DATA_FILE, batch_file, INPUT_DESCRIPTIONS)
+
+
+def export_file(out_file):
+    """Writes the table into a csv or JSONL file. Returns the number of exported rows."""
+    return bulk.export_table(DATA_FILE, out_file)
+
+
 def update(table, id_):
     """Updates specified record in the table. Asks users for new data. Returns table with the updated record."""
     return common.update_line(table, id_, [("Name: ", common.validate_string),
@@ -106,7 +124,7 @@ def update(table, id_):
 def get_info_by_id(id, req_info):
     """Returns the queried information of the partner with the given id, None in case of non-existing id."""
 
-    partner_data = data_manager.get_table_from_file("partners/partners.csv")
+    partner_data = data_manager.get_cached_table(DATA_FILE)
     for line in partner_data:
         if line[ID] == id:
             if isinstance(req_info, int):
@@ -11,6 +11,10 @@ import os
 import ui
 import data_manager
 import common
+import bulk
+import parallel
+import partitions
+import sqlite_store
 from crm import crm
 
 ID = 0
@@ -21,6 +25,21 @@ DAY = 4
 YEAR = 5
 CUSTOMER_ID = 6
 
+DATE_COLUMNS = (YEAR, MONTH, DAY)
+SECONDARY_INDEXES = (CUSTOMER_ID,)
+
+DATA_FILE = "sales/sales.csv"
+
+Sale = common.record_type("Sale", ("id", "title", "price", "month", "day", "year", "customer_id"),
+                          int_columns=(PRICE, MONTH, DAY, YEAR), file_name=DATA_FILE)
+
+INPUT_DESCRIPTIONS = [("Title: ", common.validate_string),
+                      ("Price: ", common.validate_int),
+                      ("Month of sale: ", common.validate_month),
+                      ("Day of sale: ", common.validate_day),
+                      ("Year of sale: ", common.validate_byear),
+                      ("Customer ID: ", common.validate_id_possible)]
+
 
 def start_module():
     """Starts the module and displays its menu."""
@@ -38,8 +57,8 @@ def start_module():
                "All customer IDs",
                "All sales for customers"]
 
-    sales_file = "sales/sales.csv"
-    sales_data = data_manager.get_table_from_file(sales_file)
+    sales_file = DATA_FILE
+    sales_data = data_manager.open_journaled_table(sales_file, secondary=SECONDARY_INDEXES, dates=DATE_COLUMNS)
     ui.clear_scr()
 
     while True:
@@ -72,7 +91,7 @@ def start_module():
             elif option == "12":
                 menuaction_sales_for_all_customers(sales_data)
             elif option == "0":
-                data_manager.write_table_to_file(sales_file, sales_data)
+                data_manager.save_table(sales_file, sales_data)
                 ui.clear_scr()
                 break
             else:
@@ -178,12 +197,7 @@ def show_table(table, has_customer_id=True):
 
 def add(table):
     """Asks user for input and adds it to the table. Returns table with the new record."""
-    return common.add_line(table, [("Title: ", common.validate_string),
-                                   ("Price: ", common.validate_int),
-                                   ("Month of sale: ", common.validate_month),
-                                   ("Day of sale: ", common.validate_day),
-                                   ("Year of sale: ", common.validate_byear),
-                                   ("Customer ID: ", common.validate_id_possible)])
+    return common.add_line(table, INPUT_DESCRIPTIONS)
 
 
 def remove(table, id_):
@@ -191,6 +205,16 @@ def remove(table, id_):
     return common.remove_line(table, id_)
 
 
+def import_file(batch_file):
+    """Adds the rows of a csv or JSONL batch file to the data file without prompting. Returns the new IDs."""
+    return bulk.import_batch(DATA_FILE, batch_file, INPUT_DESCRIPTIONS)
+
+
+def export_file(out_file):
+    """Writes the table into a csv or JSONL file. Returns the number of exported rows."""
+    return bulk.export_table(DATA_FILE, out_file)
+
+
 def update(table, id_):
     """Updates specified record in the table. Asks users for new data. Returns table with the updated record."""
     return common.update_line(table, id_, [("Title: ", None),
@@ -213,19 +237,34 @@ def get_lowest_price_item_id(table):
 
 
 def get_items_sold_between(table, month_from, day_from, year_from, month_to, day_to, year_to):
-    """Returns a list of sold items (as lists) between the given date boundaries."""
-
-    min_date = common.dtime(year_from, month_from, day_from)
-    max_date = common.dtime(year_to, month_to, day_to)
+    """Returns a list of sold items (as lists) between the given date boundaries.
+       On a date indexed table (see DATE_COLUMNS) or a SqliteTable the items come in date order.
+       A PartitionedTable only reads the years that overlap the range."""
+
+    min_date = common.dtime(year_from, month_from, day_from).ordinal
+    max_date = common.dtime(year_to, month_to, day_to).ordinal
+
+    if isinstance(table, sqlite_store.SqliteTable):
+        date = sqlite_store.date_ordinal_sql(Sale.fields, DATE_COLUMNS)
+        return [list(row) for row in table.query(
+            "SELECT id, title, price, month, day, year FROM {0} WHERE {1} > ? AND {1} < ? ORDER BY {1}, rowid"
+            .format(table.name, date), (min_date, max_date))]
+
+    if (isinstance(table, partitions.PartitionedTable) and table.dates is not None) or \
+            (isinstance(table, common.IndexedTable) and table.is_date_indexed()):
+        lines = table.rows_between(min_date, max_date)
+    else:
+        lines = [line for line in table
+                 if min_date < common.date_ordinal(line[YEAR], line[MONTH], line[DAY]) < max_date]
 
     return [[line[ID], line[TITLE], int(line[PRICE]), int(line[MONTH]), int(line[DAY]), int(line[YEAR])]
-            for line in table if min_date < common.dtime(line[YEAR], line[MONTH], line[DAY]) < max_date]
+            for line in lines]
 
 
 def get_title_by_id(id):
     """Returns the title (str) of the item with the given id (str) on None om case of non-existing id."""
 
-    sales_data = data_manager.get_table_from_file("sales/sales.csv")
+    sales_data = data_manager.get_cached_table(DATA_FILE)
     for line in sales_data:
         if line[ID] == id:
             return line[TITLE]
@@ -243,7 +282,7 @@ def get_title_by_id_from_table(table, id):
 
 def get_item_id_sold_last():
     """Returns the _id_ of the item that was sold most recently."""
-    return common.get_last_by_date(data_manager.get_table_from_file("sales/sales.csv"), YEAR, MONTH, DAY)[ID]
+    return common.get_last_by_date(data_manager.get_cached_table(DATA_FILE), YEAR, MONTH, DAY)[ID]
 
 
 def get_item_id_sold_last_from_table(table):
@@ -253,13 +292,18 @@ def get_item_id_sold_last_from_table(table):
 
 def get_item_title_sold_last_from_table(table):
     """Returns the _title_ of the item that was sold most recently."""
-    return common.get_last_by_date(table, YEAR, MONTH, DAY)[1]
+    return common.get_last_by_date(table, YEAR, MONTH, DAY)[TITLE]
+
+
+def get_item_ids_sold_last_from_table(table, n):
+    """Returns the _ids_ of the n items that were sold most recently, the most recent first."""
+    return [line[ID] for line in common.get_newest_by_date(table, n, YEAR, MONTH, DAY)]
 
 
 def get_the_sum_of_prices(item_ids):
     """Returns the sum of the prices of the items in the item_ids."""
 
-    table = data_manager.get_table_from_file("sales/sales.csv")
+    table = data_manager.get_cached_table(DATA_FILE)
     return get_the_sum_of_prices_from_table(table, item_ids)
 
 
@@ -271,71 +315,72 @@ def get_the_sum_of_prices_from_table(table, item_ids):
 def get_customer_id_by_sale_id(sale_id):
     """Returns the customer_id that belongs to the given sale_id,
        or None if no such sale_id is in the table."""
-    sales_data = data_manager.get_table_from_file("sales/sales.csv")
+    sales_data = data_manager.get_cached_table(DATA_FILE)
     return get_customer_id_by_sale_id_from_table(sales_data, sale_id)
 
 
 def get_customer_id_by_sale_id_from_table(table, sale_id):
     """Returns the customer_id that belongs to the given sale_id,
        or None if no such sale_id is in the table."""
-    for row in table:
-        if row[ID] == sale_id:
-            return row[CUSTOMER_ID]
-    return None
+    row = common.get_row_by_id(table, sale_id)
+    return row[CUSTOMER_ID] if row is not None else None
 
 
 def get_all_customer_ids():
     """Returns a set of customer_ids that are present in the sales table."""
-    table = data_manager.get_table_from_file("sales/sales.csv")
+    table = data_manager.get_cached_table(DATA_FILE)
     return get_all_customer_ids_from_table(table)
 
 
 def get_all_customer_ids_from_table(table):
     """Returns a set of customer_ids that are present in the sales table."""
+    if isinstance(table, common.IndexedTable) and table.is_indexed(CUSTOMER_ID):
+        return set(table.groups(CUSTOMER_ID))
     return {row[CUSTOMER_ID] for row in table}
 
 
 def get_all_sales_ids_for_customer_ids():
     """Returns a dictionary of customer_id, sale_ids where:
        key, value: customer_id, list of corresponding sale_ids"""
-    table = data_manager.get_table_from_file("sales/sales.csv")
+    table = data_manager.get_cached_table(DATA_FILE)
     return get_all_sales_ids_for_customer_ids_form_table(table)
 
 
 def get_all_sales_ids_for_customer_ids_form_table(table):
     """Returns a dictionary of customer_id, sale_ids where:
        key, value: customer_id, list of corresponding sale_ids"""
-    customer_ids = get_all_customer_ids_from_table(table)
-    return {customer_id: [row[ID] for row in table if row[CUSTOMER_ID] == customer_id] for customer_id in customer_ids}
+    return {customer_id: [row[ID] for row in rows]
+            for customer_id, rows in common.group_rows(table, CUSTOMER_ID).items()}
 
 
 def get_num_of_sales_per_customer_ids():
     """Returns a dictionary of customer_id, sale number where:
        key, value: customer_id, number of corresponding sales"""
-    sales_data = data_manager.get_table_from_file("sales/sales.csv")
+    sales_data = data_manager.get_cached_table(DATA_FILE)
     return get_num_of_sales_per_customer_ids_from_table(sales_data)
 
 
 def get_num_of_sales_per_customer_ids_from_table(table):
     """Returns a dictionary of customer_id, sale number where:
        key, value: customer_id, number of corresponding sales"""
-
-    sales_per_customers = {}
-    for row in table:
-        if row[CUSTOMER_ID] not in sales_per_customers:
-            sales_per_customers[row[CUSTOMER_ID]] = 1
-        else:
-            sales_per_customers[row[CUSTOMER_ID]] += 1
-    return sales_per_customers
+    return {customer_id: len(rows) for customer_id, rows in common.group_rows(table, CUSTOMER_ID).items()}
 
 
 def get_num_of_sales_per_customer_names_from_table(table):
     """Returns a dictionary of customer name, sale number where:
        key, value: customer name, number of corresponding sales"""
 
+    if isinstance(table, sqlite_store.SqliteTable) and data_manager.sqlite_database(crm.DATA_FILE) == table.database:
+        return table.query("SELECT customers.name, COUNT(*) FROM {} AS sales LEFT JOIN {} AS customers "
+                           "ON customers.id = sales.customer_id GROUP BY customers.name ORDER BY MIN(sales.rowid)"
+                           .format(table.name, sqlite_store.table_name(crm.DATA_FILE)))
+
+    customers = data_manager.get_cached_table(crm.DATA_FILE)
+    joined = common.hash_join(table, customers, CUSTOMER_ID, crm.ID, (), (crm.NAME,), how="left")
+
     sales_per_customers = {}
-    for row in table:
-        customer_name = crm.get_name_by_id(row[CUSTOMER_ID])
+    for row in joined:
+        customer_name = row[0]
         if customer_name not in sales_per_customers:
             sales_per_customers[customer_name] = 1
         else:
@@ -346,27 +391,43 @@ def get_num_of_sales_per_customer_names_from_table(table):
 def get_sum_of_sales_per_customer():
     """Returns a dictionary of customer name, sale number where:
        key, value: customer name, number of corresponding sales"""
-    sales_data = data_manager.get_table_from_file("sales/sales.csv")
+    sales_data = data_manager.get_cached_table(DATA_FILE)
     return get_sum_of_sales_per_customer_from_table(sales_data)
 
 
 def get_sum_of_sales_per_customer_from_table(table):
-    """Returns a dictionary with customer IDs as keys and the sum of corresponding sale prices as values."""
-    summed_sales_per_customer = {}
-    for customer in {line[CUSTOMER_ID] for line in table}:
-        sum_of_sales = common.szum_list([line[PRICE] for line in table if line[CUSTOMER_ID] == customer])
-        summed_sales_per_customer[customer] = sum_of_sales
-    return summed_sales_per_customer
+    """Returns a dictionary with customer IDs as keys and the sum of corresponding sale prices as values.
+       The table can be any iterable of rows, like data_manager.iter_table_from_file."""
+    totals = common.group_aggregate(table, CUSTOMER_ID, {"total": (PRICE, "sum")})
+    return {customer_id: aggregates["total"] for customer_id, aggregates in totals.items()}
+
+
+def get_sum_of_sales_per_customer_from_file(file_name):
+    """Streaming variant of get_sum_of_sales_per_customer_from_table, reads the file row by row."""
+    return get_sum_of_sales_per_customer_from_table(data_manager.iter_table_from_file(file_name))
+
+
+def get_sum_of_sales_per_customer_parallel(table, workers=None):
+    """Variant of get_sum_of_sales_per_customer_from_table summing chunks of the table on all cores,
+       see parallel.map_reduce."""
+    return parallel.map_reduce(get_sum_of_sales_per_customer_from_table, table, parallel.merge_totals, workers)
 
 
 def get_num_of_sales_per_customer_names():
     """Returns a dictionary of customer name, sale number where:
        key, value: customer name, number of corresponding sales"""
-    sales_data = data_manager.get_table_from_file("sales/sales.csv")
+    sales_data = data_manager.get_cached_table(DATA_FILE)
     return get_num_of_sales_per_customer_names_from_table(sales_data)
 
 
 def get_buyer_emails():
     """Returns a list tuples with buying customer names and their e-mails."""
-    sales_data = data_manager.get_table_from_file("sales/sales.csv")
-    return {(crm.get_name_by_id(row[CUSTOMER_ID]), crm.get_email_by_id(row[CUSTOMER_ID])) for row in sales_data}
+    database = data_manager.sqlite_database(DATA_FILE, crm.DATA_FILE)
+    if database is not None:
+        return set(sqlite_store.query(database, "SELECT DISTINCT customers.name, customers.email FROM {} AS sales "
+                                      "LEFT JOIN {} AS customers ON customers.id = sales.customer_id".format(
+                                          sqlite_store.table_name(DATA_FILE), sqlite_store.table_name(crm.DATA_FILE))))
+
+    sales_data = data_manager.get_cached_table(DATA_FILE)
+    customers = data_manager.get_cached_table(crm.DATA_FILE)
+    return set(common.hash_join(sales_data, customers, CUSTOMER_ID, crm.ID, (), (crm.NAME, crm.EMAIL), how="left"))
@@ -0,0 +1,83 @@
+"""
+Tables shared by the modules during one run of the program.
+
+main.py opens a TableSession and registers it with data_manager.use_session. While it is active,
+data_manager.open_journaled_table returns the same IndexedTable every time a module is entered, the
+cross-module helpers reading through data_manager.get_cached_table get that very object, and
+data_manager.save_table leaves the writing to the session. When the session is closed, only the tables
+that were changed (see IndexedTable.is_dirty) are written back, and of those only the ones whose changes
+are not already in their journal or whose journal is due for compaction.
+"""
+
+import data_manager
+
+
+class TableSession:
+    """A registry of the tables opened during a session, keyed by file name."""
+
+    def __init__(self):
+        self._tables = {}
+
+    def open(self, file_name, secondary=(), dates=None):
+        """
+        Returns the table of the file, loading it on the first call only (see data_manager.open_journaled_table).
+        Indexes requested by later calls are added to the already loaded table. The table parsed for the shared
+        cache of data_manager is dropped from it, as reads go to the session's table from then on.
+        """
+        table = self._tables.get(file_name)
+        if table is None:
+            table = data_manager.get_table_from_file(file_name, indexed=True, secondary=secondary, dates=dates)
+            data_manager.invalidate_cache(file_name)
+            table.source = file_name
+            self._tables[file_name] = table
+            return table
+
+        for col in secondary:
+            if not table.is_indexed(col):
+                table.index_column(col)
+        if dates is not None and not table.is_date_indexed():
+            table.index_dates(*dates)
+        return table
+
+    def get(self, file_name):
+        """Returns the table of the file if the session has loaded it, None otherwise."""
+        return self._tables.get(file_name)
+
+    def is_dirty(self, file_name):
+        """Returns True, if the table of the file was changed since it was loaded or last written."""
+        return file_name in self._tables and self._tables[file_name].is_dirty()
+
+    def dirty_files(self):
+        """Returns the names of the files whose tables were changed."""
+        return [file_name for file_name in self._tables if self.is_dirty(file_name)]
+
+    def written(self, file_name, table):
+        """
+        Called by data_manager.write_table_to_file. Drops the session's table if the file got other content,
+        so the next open reads the new file.
+        """
+        if file_name in self._tables and table is not self._tables[file_name]:
+            del self._tables[file_name]
+
+    def save(self, file_name):
+        """
+        Writes the table of the file back, if it was changed, following the rule of data_manager.save_table:
+        a journaled table is only written if its journal is due for compaction. Returns True, if it was written.
+        """
+        if not self.is_dirty(file_name):
+            return False
+        table = self._tables[file_name]
+        if table.source == file_name and not data_manager.journal_is_due(file_name):
+            table.mark_clean()
+            return False
+        data_manager.write_table_to_file(file_name, table)
+        return True
+
+    def save_all(self):
+        """Writes back every changed table. Returns the names of the written files."""
+        return [file_name for file_name in self.dirty_files() if self.save(file_name)]
+
+    def close(self):
+        """Writes back the changed tables and forgets every table of the session."""
+        self.save_all()
+        self._tables.clear()
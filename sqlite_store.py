@@ -0,0 +1,220 @@
+"""
+SQLite storage for module tables, as an alternative to the semicolon separated csv files.
+
+A table is stored in an SQL table named after its csv file ("sales/sales.csv" -> sales), with the columns
+of the module's record type (see tables.record_type): the ID as TEXT PRIMARY KEY, integer columns as
+INTEGER and the others as TEXT. Secondary index columns get an index each and the date columns an index
+on their date ordinal ((year * 100 + month) * 100 + day, see tables.date_ordinal), so the queries can
+run in SQL. Rows keep the table order through their rowid.
+
+Tables are switched to SQLite one by one with data_manager.use_sqlite; after that data_manager reads and
+writes them here, and the queries of the modules push work down into SQL when given a SqliteTable.
+"""
+
+import os
+
+from tables import RECORD_TYPES
+
+DATABASE_FILE = "erp.sqlite"
+
+# The range of SQLite integers.
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+# Open connections, keyed by database file name.
+_connections = {}
+
+
+def connect(database):
+    """Returns the (shared) connection to a database file."""
+    connection = _connections.get(database)
+    if connection is None:
+        # Imported here, so programs that never open a database do not pay for loading sqlite3.
+        import sqlite3
+        connection = sqlite3.connect(database)
+        _connections[database] = connection
+    return connection
+
+
+def close(database=None):
+    """Closes the connection to the given database, or every connection if no database is given."""
+    for name in ([database] if database is not None else list(_connections)):
+        connection = _connections.pop(name, None)
+        if connection is not None:
+            connection.close()
+
+
+def table_name(file_name):
+    """Returns the name of the SQL table of a data file, e.g. sales for sales/sales.csv."""
+    return os.path.splitext(os.path.basename(file_name))[0]
+
+
+def date_ordinal_sql(fields, dates):
+    """Returns the SQL expression of the date ordinal of the given year, month and day columns."""
+    year, month, day = [fields[col] for col in dates]
+    return "(({} * 100 + {}) * 100 + {})".format(year, month, day)
+
+
+def table_exists(database, file_name):
+    """Tells if the database has the SQL table of the data file."""
+    cursor = connect(database).execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                       (table_name(file_name),))
+    return cursor.fetchone() is not None
+
+
+def create_table(database, file_name, secondary=(), dates=None):
+    """
+    Creates the SQL table of a data file and its indexes, if they do not exist yet.
+    The module of the file must be imported, so its record type is registered.
+
+    Args:
+        database (str): the database file
+        file_name (str): the data file, e.g. sales.DATA_FILE
+        secondary (tuple): columns to index, e.g. the module's SECONDARY_INDEXES
+        dates (tuple): year, month and day columns to index by date ordinal, e.g. the module's DATE_COLUMNS
+    """
+    record_class = RECORD_TYPES[file_name]
+    fields = record_class.fields
+    name = table_name(file_name)
+    # Integer columns get no type, so SQLite keeps every value as bound (see _stored_row): an INTEGER column
+    # would turn a cell like "07" into 7, which no longer reads back as the same text.
+    columns = ["{} TEXT PRIMARY KEY".format(fields[0])]
+    columns.extend(["{} NOT NULL".format(fields[col]) if col in record_class.int_columns
+                    else "{} TEXT NOT NULL".format(fields[col]) for col in range(1, len(fields))])
+
+    connection = connect(database)
+    with connection:
+        connection.execute("CREATE TABLE IF NOT EXISTS {} ({})".format(name, ", ".join(columns)))
+        for col in secondary:
+            connection.execute("CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} ({1})".format(name, fields[col]))
+        if dates is not None:
+            connection.execute("CREATE INDEX IF NOT EXISTS {0}_date ON {0} ({1})".format(
+                name, date_ordinal_sql(fields, dates)))
+
+
+def signature(database, file_name):
+    """Returns a value that changes whenever the table of the data file may have changed."""
+    stat = os.stat(database)
+    return "sqlite", stat.st_mtime_ns, stat.st_size, connect(database).total_changes
+
+
+def _stored_cell(cell):
+    """Returns the integer a cell is the canonical text of ("12", "-3"), or the cell itself if there is none."""
+    try:
+        value = int(cell)
+    except ValueError:
+        return cell
+    return value if str(value) == cell and _INT64_MIN <= value <= _INT64_MAX else cell
+
+
+def _stored_row(file_name, row):
+    """
+    Returns the values stored for a row: the cells of integer columns as numbers if they read back as the same
+    text, so SQL can compute with them, every other cell as text.
+    """
+    int_columns = RECORD_TYPES[file_name].int_columns
+    return [_stored_cell(cell) if col in int_columns else cell for col, cell in enumerate(row)]
+
+
+def _text_row(row):
+    """Returns the cells of a result row as strings."""
+    return [cell if isinstance(cell, str) else str(cell) for cell in row]
+
+
+def iter_rows(database, file_name):
+    """Yields the rows of the table as lists of strings, in table order."""
+    for row in connect(database).execute("SELECT * FROM {} ORDER BY rowid".format(table_name(file_name))):
+        yield _text_row(row)
+
+
+def read_rows(database, file_name):
+    """Returns the rows of the table as lists of strings, in table order."""
+    return list(iter_rows(database, file_name))
+
+
+def write_rows(database, file_name, table):
+    """Replaces the content of the table with the given rows in a single transaction."""
+    name = table_name(file_name)
+    width = len(RECORD_TYPES[file_name].fields)
+    connection = connect(database)
+    with connection:
+        connection.execute("DELETE FROM {}".format(name))
+        connection.executemany("INSERT INTO {} VALUES ({})".format(name, ", ".join(["?"] * width)),
+                               [_stored_row(file_name, row) for row in table])
+
+
+def apply_change(database, file_name, operation, row):
+    """Applies one change ("add", "update" or "remove", see data_manager.log_change) to the table."""
+    apply_changes(database, file_name, operation, [row])
+
+
+def apply_changes(database, file_name, operation, rows):
+    """Applies the same change to several rows (see apply_change) in a single transaction."""
+    name = table_name(file_name)
+    fields = RECORD_TYPES[file_name].fields
+    connection = connect(database)
+    with connection:
+        if operation == "remove":
+            connection.executemany("DELETE FROM {} WHERE {} = ?".format(name, fields[0]), [(row[0],) for row in rows])
+        elif operation == "update":
+            assignments = ", ".join(["{} = ?".format(field) for field in fields[1:]])
+            connection.executemany("UPDATE {} SET {} WHERE {} = ?".format(name, assignments, fields[0]),
+                                   [_stored_row(file_name, row)[1:] + [row[0]] for row in rows])
+        else:
+            connection.executemany("INSERT INTO {} VALUES ({})".format(name, ", ".join(["?"] * len(fields))),
+                                   [_stored_row(file_name, row) for row in rows])
+
+
+def query(database, sql, parameters=()):
+    """Runs a query on the database and returns the result rows as tuples."""
+    return connect(database).execute(sql, parameters).fetchall()
+
+
+class SqliteTable:
+    """
+    A read-only view of a table stored in SQLite. Supports len(), iteration (rows as lists of strings),
+    lookups by ID (get_by_id, has_id: one primary key search) and query() for the queries pushed down into SQL.
+    table[row_number] and position_of are there for compatibility with the list-based helpers, but count the
+    rows before the wanted one, so look rows up with get_by_id (see common.get_row_by_id) instead.
+    Every access reads the current content of the database.
+    """
+
+    def __init__(self, database, file_name):
+        self.database = database
+        self.file_name = file_name
+        self.name = table_name(file_name)
+        self.fields = RECORD_TYPES[file_name].fields
+
+    def __len__(self):
+        return self.query("SELECT COUNT(*) FROM {}".format(self.name))[0][0]
+
+    def __iter__(self):
+        return iter_rows(self.database, self.file_name)
+
+    def __getitem__(self, row_number):
+        if row_number < 0:
+            row_number += len(self)
+        rows = self.query("SELECT * FROM {} ORDER BY rowid LIMIT 1 OFFSET ?".format(self.name), (row_number,))
+        if row_number < 0 or not rows:
+            raise IndexError("SqliteTable row number out of range")
+        return _text_row(rows[0])
+
+    def position_of(self, id_):
+        """Returns the row number of the row with the given ID, or -1 if not found. Counts the rows before it."""
+        if not self.has_id(id_):
+            return -1
+        return self.query("SELECT COUNT(*) FROM {0} WHERE rowid < (SELECT rowid FROM {0} WHERE {1} = ?)".format(
+            self.name, self.fields[0]), (id_,))[0][0]
+
+    def has_id(self, id_):
+        """Returns True, if a row with the given ID is in the table."""
+        return bool(self.query("SELECT 1 FROM {} WHERE {} = ?".format(self.name, self.fields[0]), (id_,)))
+
+    def get_by_id(self, id_):
+        """Returns the row with the given ID, or None if not found."""
+        rows = self.query("SELECT * FROM {} WHERE {} = ?".format(self.name, self.fields[0]), (id_,))
+        return _text_row(rows[0]) if rows else None
+
+    def query(self, sql, parameters=()):
+        """Runs a query on the database of the table, see the query function."""
+        return query(self.database, sql, parameters)
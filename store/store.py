@@ -11,6 +11,7 @@ import os
 import ui
 import data_manager
 import common
+import bulk
 
 ID = 0
 TITLE = 1
@@ -18,6 +19,11 @@ MANUFACTURER = 2
 PRICE = 3
 IN_STOCK = 4
 
+DATA_FILE = "store/games.csv"
+
+Game = common.record_type("Game", ("id", "title", "manufacturer", "price", "in_stock"),
+                          int_columns=(PRICE, IN_STOCK), file_name=DATA_FILE)
+
 INPUT_DESCRIPTIONS = [("Title: ", common.validate_string),
                       ("Manufacturer: ", common.validate_string),
                       ("Price: ", common.validate_int),
@@ -71,7 +77,7 @@ def start_module():
                "Show Game Count Per Manufacturer",
                "Show Average Game Count of a Manufacturer"]
 
-    store_data = data_manager.get_table_from_file("store/games.csv")
+    store_data = data_manager.open_journaled_table(DATA_FILE)
 
     try:
         ui.clear_scr()
@@ -92,16 +98,13 @@ def start_module():
             elif option == "6":
                 menuaction_average_by_manufacturer(store_data)
             elif option == "0":
-                for game in store_data:
-                    game[PRICE] = str(game[PRICE])
-                    game[IN_STOCK] = str(game[IN_STOCK])
-                data_manager.write_table_to_file("store/games.csv", store_data)
+                data_manager.save_table(DATA_FILE, store_data)
                 ui.clear_scr()
                 break
             else:
                 ui.clear_scr()
     except (KeyboardInterrupt, EOFError):
-        common.handle_kb_interrupt("store/games.csv", store_data)
+        common.handle_kb_interrupt(DATA_FILE, store_data)
 
 
 def show_table(table):
@@ -120,22 +123,33 @@ def remove(table, id_):
     return common.remove_line(table, id_)
 
 
+def import_file(batch_file):
+    """Adds the rows of a csv or JSONL batch file to the data file without prompting. Returns the new IDs."""
+    return bulk.import_batch(DATA_FILE, batch_file, INPUT_DESCRIPTIONS)
+
+
+def export_file(out_file):
+    """Writes the table into a csv or JSONL file. Returns the number of exported rows."""
+    return bulk.export_table(DATA_FILE, out_file)
+
+
 def update(table, id_):
     """Updates specified record in the table. Asks users for new data. Returns table with the updated record."""
     return common.update_line(table, id_, INPUT_DESCRIPTIONS)
 
 
 def get_counts_by_manufacturers(table):
-    """Returns dictionary containing the number of games (value) per manufacturer (key)."""
-    manufacturers = {row[MANUFACTURER] for row in table}
-
-    count_by_manufacturers = {}
+    """
+    Returns dictionary containing the number of games (value) per manufacturer (key).
+    The table can be any iterable of rows, like data_manager.iter_table_from_file.
+    """
+    counts = common.group_aggregate(table, MANUFACTURER, {"games": (None, "count")})
+    return {manufacturer: aggregates["games"] for manufacturer, aggregates in counts.items()}
 
-    for manufacturer in manufacturers:
-        num_games = len([row for row in table if row[MANUFACTURER] == manufacturer])
-        count_by_manufacturers[manufacturer] = num_games
 
-    return count_by_manufacturers
+def get_counts_by_manufacturers_from_file(file_name):
+    """Streaming variant of get_counts_by_manufacturers, reads the file row by row."""
+    return get_counts_by_manufacturers(data_manager.iter_table_from_file(file_name))
 
 
 def get_average_by_manufacturer(table, manufacturer):
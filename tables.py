@@ -0,0 +1,367 @@
+"""Table types that keep lookup structures in sync with their rows."""
+
+from bisect import bisect_left, bisect_right
+
+
+def date_ordinal(year, month, day):
+    """
+    Returns a date as one compact, ordered integer (20161023 for 2016/10/23), so dates can be compared,
+    sorted and searched as plain ints. Accepts ints or numeric strings.
+    """
+    return (int(year) * 100 + int(month)) * 100 + int(day)
+
+
+class DateIndex:
+    """The rows of a table ordered by their (year, month, day) columns, kept as parallel sorted lists."""
+
+    def __init__(self, rows, year_col, month_col, day_col):
+        self.columns = (year_col, month_col, day_col)
+        keyed = [(self.ordinal_of(rows[position]), position) for position in range(len(rows))]
+        # common.srt cannot be used below common, which imports this module.
+        keyed.sort()
+        self.ordinals = [ordinal for ordinal, _ in keyed]
+        self.rows = [rows[position] for _, position in keyed]
+
+    def ordinal_of(self, row):
+        year_col, month_col, day_col = self.columns
+        return date_ordinal(row[year_col], row[month_col], row[day_col])
+
+    def add(self, row):
+        ordinal = self.ordinal_of(row)
+        position = bisect_right(self.ordinals, ordinal)
+        self.ordinals.insert(position, ordinal)
+        self.rows.insert(position, row)
+
+    def discard(self, row):
+        position = bisect_left(self.ordinals, self.ordinal_of(row))
+        while self.rows[position] is not row:
+            position += 1
+        del self.ordinals[position]
+        del self.rows[position]
+
+    def between(self, first, last, inclusive=False):
+        """Returns the rows dated between the first and last ordinals, in date order."""
+        if inclusive:
+            return self.rows[bisect_left(self.ordinals, first):bisect_right(self.ordinals, last)]
+        return self.rows[bisect_right(self.ordinals, first):bisect_left(self.ordinals, last)]
+
+
+class IndexedTable(list):
+    """
+    A list of rows (like the ones returned by data_manager) that also maintains an ID -> row position
+    dictionary, so looking up, adding and checking IDs no longer needs to scan the whole table.
+
+    Rows must be modified through the table (item assignment, append, del, ...) and not by changing
+    the ID cell of a row in place, otherwise the index gets out of sync.
+
+    If source is set to a file name, common.add_line, update_line and remove_line record their
+    changes in the journal of that file (see data_manager.open_journaled_table).
+
+    Every change made through the table bumps its version, so is_dirty tells if the rows still match
+    their file. Cells changed in place are not noticed either.
+    """
+
+    source = None
+
+    # Name of the file the rows were read from or last written to, see is_dirty.
+    loaded_from = None
+
+    def __init__(self, rows=(), id_col=0, secondary=(), dates=None):
+        super().__init__(rows)
+        self.id_col = id_col
+        self.version = 0
+        self.saved_version = 0
+        self._positions = {}
+        self._reindex_from(0)
+        self._secondary = {}
+        for col in secondary:
+            self.index_column(col)
+        self._dates = None
+        if dates is not None:
+            self.index_dates(*dates)
+
+    def is_dirty(self):
+        """Returns True, if the rows changed since the table was created or last marked clean."""
+        return self.version != self.saved_version
+
+    def mark_clean(self):
+        """Records that the rows match their file, e.g. after writing them."""
+        self.saved_version = self.version
+
+    def _reindex_from(self, start):
+        """Rebuilds the positions of the rows from the given position to the end of the table."""
+        id_col = self.id_col
+        positions = self._positions
+        for position in range(start, len(self)):
+            positions[self[position][id_col]] = position
+
+    def position_of(self, id_):
+        """Returns the position of the row with the given ID, or -1 if not found."""
+        return self._positions.get(id_, -1)
+
+    def has_id(self, id_):
+        """Returns True, if a row with the given ID is in the table."""
+        return id_ in self._positions
+
+    def get_by_id(self, id_):
+        """Returns the row with the given ID, or None if not found."""
+        position = self._positions.get(id_, -1)
+        return self[position] if position != -1 else None
+
+    def ids(self):
+        """Returns a read-only view of the IDs in the table."""
+        return self._positions.keys()
+
+    def index_column(self, col):
+        """
+        Declares a secondary (non-unique) index on the given column. The index maps every value of the column
+        to the rows having that value, in table order, and is kept up to date by the table's own methods.
+        """
+        groups = {}
+        for row in self:
+            groups.setdefault(row[col], []).append(row)
+        self._secondary[col] = groups
+
+    def is_indexed(self, col):
+        """Returns True, if a secondary index is declared on the given column."""
+        return col in self._secondary
+
+    def groups(self, col):
+        """Returns the value -> rows dictionary of the secondary index on the given column. Do not modify it."""
+        return self._secondary[col]
+
+    def rows_with(self, col, value):
+        """Returns the rows having the given value in an indexed column. Do not modify the returned list."""
+        return self._secondary[col].get(value, [])
+
+    def index_dates(self, year_col, month_col, day_col):
+        """
+        Declares a date index on the given year, month and day columns: the rows ordered by date
+        (see date_ordinal), kept up to date by the table's own methods. Date range queries on it are
+        a binary search and a slice instead of a full scan.
+        """
+        self._dates = DateIndex(self, year_col, month_col, day_col)
+
+    def is_date_indexed(self, columns=None):
+        """Returns True, if a date index is declared (on the given year, month and day columns, if given)."""
+        return self._dates is not None and (columns is None or self._dates.columns == tuple(columns))
+
+    def rows_between(self, first, last, inclusive=False):
+        """Returns the rows dated strictly (or inclusively) between two date ordinals, in date order."""
+        return self._dates.between(first, last, inclusive)
+
+    def rows_by_date(self):
+        """Returns the rows in date order (oldest first). Do not modify the returned list."""
+        return self._dates.rows
+
+    def _index_row(self, row):
+        self.version += 1
+        if self._dates is not None:
+            self._dates.add(row)
+        for col, groups in self._secondary.items():
+            groups.setdefault(row[col], []).append(row)
+
+    def _unindex_row(self, row):
+        self.version += 1
+        if self._dates is not None:
+            self._dates.discard(row)
+        for col, groups in self._secondary.items():
+            group = groups[row[col]]
+            del group[_identity_position(group, row)]
+            if not group:
+                del groups[row[col]]
+
+    def _replace_indexed_row(self, old_row, row):
+        self.version += 1
+        if self._dates is not None:
+            self._dates.discard(old_row)
+            self._dates.add(row)
+        for col, groups in self._secondary.items():
+            if old_row[col] == row[col]:
+                group = groups[row[col]]
+                group[_identity_position(group, old_row)] = row
+            else:
+                group = groups[old_row[col]]
+                del group[_identity_position(group, old_row)]
+                if not group:
+                    del groups[old_row[col]]
+                groups.setdefault(row[col], []).append(row)
+
+    def append(self, row):
+        super().append(row)
+        self._positions[row[self.id_col]] = len(self) - 1
+        self._index_row(row)
+
+    def extend(self, rows):
+        start = len(self)
+        super().extend(rows)
+        self._reindex_from(start)
+        for position in range(start, len(self)):
+            self._index_row(self[position])
+
+    def __iadd__(self, rows):
+        self.extend(rows)
+        return self
+
+    def insert(self, position, row):
+        super().insert(position, row)
+        self._reindex_from(max(0, min(position, len(self) - 1)))
+        self._index_row(row)
+
+    def __setitem__(self, position, row):
+        if isinstance(position, slice):
+            super().__setitem__(position, row)
+            self._rebuild()
+            return
+        old_row = self[position]
+        super().__setitem__(position, row)
+        if old_row[self.id_col] != row[self.id_col]:
+            del self._positions[old_row[self.id_col]]
+            self._positions[row[self.id_col]] = position % len(self)
+        if old_row is not row:
+            self._replace_indexed_row(old_row, row)
+
+    def __delitem__(self, position):
+        if isinstance(position, slice):
+            super().__delitem__(position)
+            self._rebuild()
+            return
+        position = position % len(self)
+        row = self[position]
+        del self._positions[row[self.id_col]]
+        self._unindex_row(row)
+        super().__delitem__(position)
+        self._reindex_from(position)
+
+    def pop(self, position=-1):
+        row = self[position]
+        del self[position]
+        return row
+
+    def remove(self, row):
+        for position in range(len(self)):
+            if self[position] == row:
+                del self[position]
+                return
+        raise ValueError("IndexedTable.remove(row): row not in table")
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self._rebuild()
+
+    def reverse(self):
+        super().reverse()
+        self._rebuild()
+
+    def __imul__(self, times):
+        raise TypeError("Repeating the rows of an IndexedTable would duplicate its IDs.")
+
+    def clear(self):
+        super().clear()
+        self._rebuild()
+
+    def _rebuild(self):
+        self.version += 1
+        self._positions.clear()
+        self._reindex_from(0)
+        for col in self._secondary:
+            self.index_column(col)
+        if self._dates is not None:
+            self.index_dates(*self._dates.columns)
+
+
+def _identity_position(rows, row):
+    """Returns the position of the very same row object in the list of rows."""
+    for position in range(len(rows)):
+        if rows[position] is row:
+            return position
+    raise ValueError("Row is missing from the secondary index.")
+
+
+# Record types created for a data file with record_type, keyed by the file name.
+RECORD_TYPES = {}
+
+
+class Record:
+    """
+    Base class of the compact, typed rows made by record_type. A record stores its cells in slots
+    (no per-row list or dict), with integer columns already converted to int, and still behaves like
+    a row of the table: record[col], record[col] = value, len(record) and iteration work by column number.
+    """
+    __slots__ = ()
+    fields = ()
+    int_columns = frozenset()
+
+    def __init__(self, *values):
+        if len(values) != len(self.fields):
+            raise TypeError("{} takes {} values, got {}".format(type(self).__name__, len(self.fields), len(values)))
+        for field, value in zip(self.fields, values):
+            object.__setattr__(self, field, value)
+
+    @classmethod
+    def from_row(cls, row):
+        """Creates a record from a row of strings (as read by data_manager), converting the integer columns."""
+        int_columns = cls.int_columns
+        return cls(*[int(cell) if col in int_columns else cell for col, cell in enumerate(row)])
+
+    def to_row(self):
+        """Returns the record as a row of strings (as written by data_manager)."""
+        return [str(getattr(self, field)) for field in self.fields]
+
+    def __getitem__(self, col):
+        if isinstance(col, slice):
+            return [getattr(self, field) for field in self.fields[col]]
+        return getattr(self, self.fields[col])
+
+    def __setitem__(self, col, value):
+        setattr(self, self.fields[col], value)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __iter__(self):
+        for field in self.fields:
+            yield getattr(self, field)
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return type(self) is type(other) and self[:] == other[:]
+        if isinstance(other, (list, tuple)):
+            return self[:] == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "{}({})".format(type(self).__name__, ", ".join([repr(value) for value in self]))
+
+
+def record_type(name, fields, int_columns=(), file_name=None):
+    """
+    Creates a Record subclass for a module's table schema.
+
+    Args:
+        name (str): name of the class, e.g. "Sale"
+        fields (tuple): names of the columns, in the order of the module's column constants
+        int_columns (tuple): column numbers whose values are integers (PRICE, YEAR, ...)
+        file_name (str): the data file of the module. If given, the type is registered in RECORD_TYPES.
+
+    Returns:
+        The new class.
+    """
+    record_class = type(name, (Record,), {"__slots__": tuple(fields),
+                                          "fields": tuple(fields),
+                                          "int_columns": frozenset(int_columns)})
+    if file_name is not None:
+        RECORD_TYPES[file_name] = record_class
+    return record_class
+
+
+def to_records(table, record_class):
+    """Converts a table of string rows into a list of records of the given type."""
+    return [record_class.from_row(row) for row in table]
+
+
+def to_rows(records):
+    """Converts records back into a table of string rows."""
+    return [record.to_row() for record in records]
@@ -0,0 +1,133 @@
+"""
+Batch validation of table rows.
+
+A module's input specifier list (request message-validator function pairs, see common.add_line) is compiled
+into a RowValidator: the common.validate_* functions are replaced by equivalent precompiled regular
+expressions and set lookups, and every distinct value of a column is validated only once per batch.
+Validators without a compiled equivalent are called as they are.
+"""
+
+import re
+
+import common
+import data_manager
+
+_INT = re.compile(r"\s*[+-]?\d(?:_?\d)*\s*")
+_EMAIL = re.compile(r"[^@]+@[^@.]+\.[^@]+")
+_ID_CHARACTER_CLASSES = [re.compile("[{0}].*[{0}]".format(re.escape(characters)), re.DOTALL)
+                         for characters in common.CHR_TYPES.values()]
+
+
+def __int_between(low, high):
+    """Returns a validator accepting the integers from low to high (either may be None for no limit)."""
+    def validate(cell):
+        if _INT.fullmatch(cell) is None:
+            return False
+        value = int(cell)
+        return (low is None or low <= value) and (high is None or value <= high)
+    return validate
+
+
+def __validate_id_possible(cell):
+    for pattern in _ID_CHARACTER_CLASSES:
+        if pattern.search(cell) is None:
+            return False
+    return True
+
+
+_COMPILED = {
+    common.validate_int: __int_between(None, None),
+    common.validate_byear: __int_between(None, common.CURRENT_YEAR),
+    common.validate_fyear: __int_between(common.CURRENT_YEAR, None),
+    common.validate_month: __int_between(1, 12),
+    common.validate_day: __int_between(1, 31),
+    common.validate_boolean: __int_between(0, 1),
+    common.validate_type: frozenset(("in", "out")).__contains__,
+    common.validate_string: bool,
+    common.validate_email: lambda cell: _EMAIL.fullmatch(cell) is not None,
+    common.validate_id_possible: __validate_id_possible,
+}
+
+
+def compile_validator(validator):
+    """
+    Returns a fast validator of strings that gives the same verdicts as the given common.validate_* function.
+    None (no validation) becomes a validator accepting everything; other functions are returned unchanged.
+    """
+    if validator is None:
+        return lambda cell: True
+    return _COMPILED.get(validator, validator)
+
+
+class RowValidator:
+    """
+    Validates whole rows against a module's input specifier list, e.g.
+    RowValidator(store.INPUT_DESCRIPTIONS, with_id=True).validate(table)
+
+    Cells must not contain ";" or line breaks, which the data files cannot store.
+    """
+
+    def __init__(self, input_specifiers, with_id=False):
+        specifiers = list(input_specifiers)
+        if with_id:
+            specifiers.insert(0, ("ID", common.validate_id_possible))
+        self.with_id = with_id
+        self.names = [message.strip(" :?") for message, _ in specifiers]
+        self.validators = [compile_validator(validator) for _, validator in specifiers]
+
+    def __call__(self, row):
+        """Returns True, if every cell of the row is valid."""
+        return len(row) == len(self.validators) and all(
+            [";" not in cell and "\n" not in cell and validator(cell)
+             for validator, cell in zip(self.validators, row)])
+
+    def validate(self, rows):
+        """
+        Validates a batch of rows column by column.
+
+        Args:
+            rows: an iterable of rows of strings
+
+        Returns:
+            A list of (row number, message) pairs in row order, empty if every row is valid.
+            With IDs, duplicate IDs are reported too.
+        """
+        rows = rows if isinstance(rows, list) else list(rows)
+        width = len(self.validators)
+        errors = [(row_number, "expected {} cells, got {}".format(width, len(row)))
+                  for row_number, row in enumerate(rows) if len(row) != width]
+        complete = [row_number for row_number, row in enumerate(rows) if len(row) == width]
+
+        for col, validator in enumerate(self.validators):
+            verdicts = {}
+            for row_number in complete:
+                cell = rows[row_number][col]
+                verdict = verdicts.get(cell)
+                if verdict is None:
+                    verdict = verdicts[cell] = ";" not in cell and "\n" not in cell and bool(validator(cell))
+                if not verdict:
+                    errors.append((row_number, "invalid {} {!r}".format(self.names[col], cell)))
+
+        if self.with_id:
+            seen = set()
+            for row_number in complete:
+                id_ = rows[row_number][0]
+                if id_ in seen:
+                    errors.append((row_number, "duplicate ID {!r}".format(id_)))
+                seen.add(id_)
+
+        return common.srt(errors, key=lambda error: error[0])
+
+
+def check_file(file_name, input_specifiers):
+    """
+    Checks the integrity of a data file: every row must have a possible, unique ID and valid cells.
+
+    Args:
+        file_name (str): the data file of a module, e.g. store.DATA_FILE
+        input_specifiers (list of tuples): the module's request message-validator function pairs
+
+    Returns:
+        A list of (row number, message) pairs, empty if the file is intact.
+    """
+    return RowValidator(input_specifiers, with_id=True).validate(data_manager.iter_table_from_file(file_name))